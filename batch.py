@@ -0,0 +1,65 @@
+import array
+import concurrent.futures
+from moveset import *
+from rollback import pack_controls, unpack_controls
+
+# Runs many headless matches at once across a pool of processes, for balance testing and training bots.
+# Every match uses the same move set, which is sent to each worker process once when it starts rather than with every match.
+# Only the input scripts and results go back and forth per match, and scripts are sent with each fighter's controls packed into a byte per frame.
+
+# The result of one match.
+class match_result:
+	def __init__(self, n_fighters):
+		# Index of the fighter with the most health at the end, or None on a tie.
+		self.winner = None
+
+		# Health of each fighter after every frame.
+		self.health = [array.array("d") for i in range(n_fighters)]
+
+		# Number of hits each fighter landed, and the damage they did.
+		self.hits = [0]*n_fighters
+		self.damage = [0]*n_fighters
+
+# Start stance of the move set of the worker process, set by init_worker().
+worker_start = None
+
+# Sets up a worker process. moveset is a stance, or a function which builds one and is called once here (like moveset.jab_combo()).
+def init_worker(moveset):
+	global worker_start
+	if callable(moveset):
+		moveset = moveset()
+	worker_start = moveset
+
+# Returns a script packed into bytes, with one byte of controls (see rollback.pack_controls()) per fighter per frame.
+def pack_script(script):
+	return bytes(pack_controls(vals) for frame_inputs in script for vals in frame_inputs)
+
+# Plays one match in a worker process. job is (packed script, deterministic).
+def run_job(job):
+	script, deterministic = job
+	f = standard_fight(worker_start, deterministic)
+	n = len(f.fighters)
+	r = match_result(n)
+
+	for i in range(0, len(script), n):
+		f.simulate(1, [[unpack_controls(b) for b in script[i:i+n]]])
+
+		for a, b, dmg in f.hits:
+			r.hits[a.index] += 1
+			r.damage[a.index] += dmg
+		for j in range(n):
+			r.health[j].append(f.fighters[j].health)
+
+	health = [fi.health for fi in f.fighters]
+	best = max(health)
+	if health.count(best) == 1:
+		r.winner = health.index(best)
+	return r
+
+# Plays a standard_fight() for each input script and returns the match_results in the same order.
+# A script has an entry for every frame with a sequence of control values for each fighter, like the inputs of fight.simulate().
+# moveset is passed to init_worker() in each of the pool's processes. processes defaults to one per CPU.
+# Matches are handed out chunksize at a time, which cuts down on messages between processes when matches are short.
+def run_batch(moveset, scripts, deterministic=False, processes=None, chunksize=1):
+	with concurrent.futures.ProcessPoolExecutor(processes, initializer=init_worker, initargs=(moveset,)) as pool:
+		return list(pool.map(run_job, [(pack_script(s), deterministic) for s in scripts], chunksize=chunksize))
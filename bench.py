@@ -0,0 +1,903 @@
+import sys
+import asyncio
+import timeit
+import random
+from fighter import *
+from moveset import *
+
+# Standalone benchmarks for the hot paths of the game.
+# Run "py bench.py" to run all of them, or "py bench.py <name> ..." to only run the named ones.
+# Add "--json <path>" to save every time reported to a JSON file, and "--compare <path>" to compare them against one saved earlier,
+# for example on another commit.
+
+benchmarks = {}
+
+# Times reported by each benchmark run so far, in ns/op, as {benchmark: {name: ns}}, and the benchmark running now.
+results = {}
+running = None
+
+# Decorator which registers a benchmark under its function name.
+def benchmark(f):
+	benchmarks[f.__name__] = f
+	return f
+
+# Returns the best-of-repeat time of one call to f in nanoseconds.
+def ns_per_op(f, number=100000, repeat=5):
+	return min(timeit.repeat(f, number=number, repeat=repeat)) / number * 1e9
+
+# Returns the number of instances of the passed classes created by one call to f.
+def count_allocs(f, *classes):
+	n = [0]
+	inits = [cls.__init__ for cls in classes]
+
+	def counting(init):
+		def counting_init(self, *args, **kwargs):
+			n[0] += 1
+			init(self, *args, **kwargs)
+		return counting_init
+
+	for cls, init in zip(classes, inits):
+		cls.__init__ = counting(init)
+	try:
+		f()
+	finally:
+		for cls, init in zip(classes, inits):
+			cls.__init__ = init
+	return n[0]
+
+# Returns the memory held by one object, including its __dict__ if it has one.
+def instance_size(o):
+	size = sys.getsizeof(o)
+	if hasattr(o, "__dict__"):
+		size += sys.getsizeof(o.__dict__)
+	return size
+
+def report(name, ns, allocs=None, what="vec2"):
+	results.setdefault(running, {})[name] = ns
+	if allocs is None:
+		print("  %-48s %10.1f ns/op" % (name, ns))
+	else:
+		print("  %-48s %10.1f ns/op %4d %s allocs/op" % (name, ns, allocs, what))
+
+# -------- Benchmarks --------
+
+@benchmark
+def vec2_ops():
+	a = vec2(3, 4)
+	b = vec2(1, 2)
+	r1 = Rectangle(0, 0, 10, 10)
+	r2 = Rectangle(5, 5, 15, 15)
+	c = Circle(12, 5, 3)
+
+	cases = [
+		("a + b",                  lambda: a + b),
+		("a - b",                  lambda: a - b),
+		("a.iadd(b)",              lambda: a.iadd(b)),
+		("a.isub(b)",              lambda: a.isub(b)),
+		("a.normalize(5)",         lambda: a.normalize(5)),
+		("a.normalize_(5)",        lambda: a.normalize_(5)),
+		("a.scale_(1)",            lambda: a.scale_(1)),
+		("a.dot(b)",               lambda: a.dot(b)),
+		("a < b",                  lambda: a < b),
+		("Rectangle.collide_rectangle", lambda: r1.collide_rectangle(r2)),
+		("Rectangle.collide_circle",    lambda: r1.collide_circle(c)),
+	]
+
+	for name, f in cases:
+		report(name, ns_per_op(f), count_allocs(f, vec2))
+
+@benchmark
+def collider_copy():
+	for o in [vec2(1, 2), Point(1, 2), Rectangle(0, 0, 1, 1), Circle(0, 0, 1), Collision(None, None, vec2(0, 0))]:
+		print("  %-48s %10d bytes" % (type(o).__name__, instance_size(o)))
+
+	for n in [1, 10, 100]:
+		hb = Hitbox()
+		for i in range(n):
+			if i % 2 == 0:
+				hb.add_collider(Rectangle(i, 0, i + 10, 10))
+			else:
+				hb.add_collider(Circle(i, 5, 5))
+		report("Hitbox.copy (%d colliders)" % n, ns_per_op(hb.copy, number=100000 // n))
+
+# Pair of n-collider hitboxes that do not touch, so both engines have to test every pair.
+def hitbox_pair(n):
+	a = Hitbox()
+	b = Hitbox()
+	for i in range(n):
+		if i % 2 == 0:
+			a.add_collider(Rectangle(i*20, 0, i*20 + 10, 10))
+			b.add_collider(Circle(i*20, 100, 5))
+		else:
+			a.add_collider(Circle(i*20, 5, 5))
+			b.add_collider(Rectangle(i*20, 100, i*20 + 10, 110))
+	return a, b
+
+@benchmark
+def hitbox_batch():
+	from collision_np import HitboxArrays, collide_hitbox_batch
+
+	for n in [1, 10, 100]:
+		a, b = hitbox_pair(n)
+		aa, ba = HitboxArrays(a), HitboxArrays(b)
+		number = 20000 // (n*n) + 10
+		report("collide_hitbox (%dx%d)" % (n, n), ns_per_op(lambda: a.collide_hitbox(b), number=number))
+		report("collide_hitbox_batch (%dx%d)" % (n, n), ns_per_op(lambda: collide_hitbox_batch(aa, ba), number=number))
+
+# Fight on a stage of n randomly placed 200x20 platforms, with one fighter standing on a floor at the origin.
+def stage(n, seed=0):
+	rnd = random.Random(seed)
+	size = int((n**0.5) * 400)
+
+	f = fight()
+	f.add_platform(pg.Rect(-100, 0, 200, 20))
+	for i in range(n - 1):
+		f.add_platform(pg.Rect(rnd.randint(-size, size), rnd.randint(-size, size), 200, 20))
+
+	s = stance(Hitbox(Rectangle(-12, -75, 12, 0)))
+	f.add_fighter(pg.Rect(-12, -75, 24, 75), s, team=0)
+	return f
+
+@benchmark
+def platform_broadphase():
+	for n in [10, 1000, 50000]:
+		f = stage(n)
+		a = f.fighters[0]
+		number = max(10, 100000 // n)
+
+		hb = a.stance.hb.copy()
+		hb.move(a.pos)
+		report("all platforms (%d platforms)" % n, ns_per_op(lambda: [hb.collide_hitbox(p.collider) for p in f.platforms], number=number, repeat=3))
+		report("fighter.update (%d platforms)" % n, ns_per_op(a.update, number=1000))
+
+# That sweep and prune finds the same hits as all pairs is tested by tests/test_collision.py.
+@benchmark
+def attack_broadphase():
+	for n in [2, 16, 64, 256]:
+		f = crowd(n)
+		number = max(3, 2000 // n)
+
+		report("all pairs (%d fighters)" % n, ns_per_op(lambda: attack_hits_all_pairs(f), number=number, repeat=3))
+		report("sweep and prune (%d fighters)" % n, ns_per_op(f.attack_hits, number=number, repeat=3))
+
+@benchmark
+def transformed_collision():
+	a = Hitbox([Rectangle(-12, -75, 12, 0), Circle(0, -85, 10)])
+	b = Hitbox(Rectangle(-500, 0, 500, 20))
+	pos = vec2(100, 1)
+	copies = lambda: transformed_copy(a, -1, pos).collide_hitbox(b)
+	in_place = lambda: a.collide_hitbox_at(-1, pos, b)
+	geometry = [Point, Rectangle, Circle, Hitbox]
+	report("copy, flip_x, move, collide_hitbox", ns_per_op(copies), count_allocs(copies, *geometry), "collider")
+	report("collide_hitbox_at", ns_per_op(in_place), count_allocs(in_place, *geometry), "collider")
+
+	# Allocations over one frame of two fighters jabbing each other on a floor.
+	f = crowd(2)
+	f.fighters[0].pos.x = 0
+	f.fighters[1].pos.x = 30
+	f.add_platform(pg.Rect(-500, 0, 1000, 20))
+	f.update()
+	atk = jab()
+	for a in f.fighters:
+		a.attack(atk)
+		a.atk_frame = 2
+	n = count_allocs(f.update, *geometry)
+	print("  %-48s %24d collider allocs/frame" % ("fight.update (2 fighters)", n))
+
+# That the index picks the same connections as the linear scan is tested by tests/test_stance.py.
+@benchmark
+def stance_event():
+	for n_stances, n_connections in [(500, 5000), (1, 500)]:
+		stances = move_graph(n_stances, n_connections)
+		rnd = random.Random(1)
+		queries = [(rnd.choice(stances), rnd.randint(0, 4), rnd.randint(0, 40)) for i in range(1000)]
+		name = "%d stances, %d connections" % (n_stances, n_connections)
+		report("linear scan (%s)" % name, ns_per_op(lambda: [s.first_valid(tr, t) for s, tr, t in queries], number=20) / len(queries))
+		report("indexed event (%s)" % name, ns_per_op(lambda: [s.event(tr, t) for s, tr, t in queries], number=20) / len(queries))
+
+@benchmark
+def simulate():
+	n = 3000
+	inputs = random_inputs(n)
+
+	f = standard_fight()
+	t = timeit.default_timer()
+	f.simulate(n, inputs)
+	t = timeit.default_timer() - t
+
+	report("fight.simulate (2 fighters, per frame)", t / n * 1e9)
+	print("  %-48s %10.0f frames/s" % ("fight.simulate (2 fighters)", n / t))
+
+# Times deterministic fights. Their determinism is tested by tests/test_determinism.py.
+@benchmark
+def determinism():
+	n = 3000
+	inputs = brawl_inputs(n)
+
+	f = standard_fight(deterministic=True)
+	f.simulate(n, inputs)
+	print("  %-48s %10s" % ("final health (fixed point)", "%d, %d" % (f.fighters[0].health, f.fighters[1].health)))
+
+	for deterministic in [False, True]:
+		f = standard_fight(deterministic=deterministic)
+		t = timeit.default_timer()
+		f.simulate(n, inputs)
+		t = timeit.default_timer() - t
+		report("fight.simulate (%s, per frame)" % ("fixed point" if deterministic else "float"), t / n * 1e9)
+
+	f = standard_fight(deterministic=True)
+	f.simulate(100, inputs)
+	report("fight.checksum (2 fighters)", ns_per_op(f.checksum, number=20000))
+
+# That restoring a snapshot reproduces the fight is tested by tests/test_rollback.py.
+@benchmark
+def snapshot():
+	inputs = random_inputs(300)
+	f = standard_fight()
+	f.simulate(300, inputs)
+
+	snap = f.snapshot()
+	print("  %-48s %10d bytes" % ("snapshot size (2 fighters)", len(snap) * snap.itemsize))
+	report("fight.snapshot (2 fighters)", ns_per_op(f.snapshot, number=20000))
+	report("fight.restore (2 fighters)", ns_per_op(lambda: f.restore(snap), number=20000))
+
+	def rollback():
+		f.restore(snap)
+		for i in range(8):
+			f.update()
+			f.snapshot()
+	report("restore + 8 x (update + snapshot)", ns_per_op(rollback, number=300))
+
+# Plays a match between two rollback sessions over a loopback_link for n ticks. Returns the two sessions and the time taken.
+# That the peers agree on every confirmed state is tested by tests/test_rollback.py.
+def rollback_match(n, input_delay=2, max_rollback=8, **link_args):
+	from net import loopback_link
+	from rollback import rollback_session
+
+	link = loopback_link(**link_args)
+	peers = [
+		rollback_session(standard_fight(), 0, link.a, input_delay, max_rollback),
+		rollback_session(standard_fight(), 1, link.b, input_delay, max_rollback),
+	]
+	inputs = random_inputs(n)
+
+	t = timeit.default_timer()
+	for i in range(n):
+		link.tick()
+		for p in range(2):
+			peers[p].advance(inputs[i][p])
+	t = timeit.default_timer() - t
+	return peers, t
+
+@benchmark
+def rollback():
+	n = 1000
+	for name, link_args in [
+		("no latency", {}),
+		("3 tick delay, 2 jitter", {"delay": 3, "jitter": 2}),
+		("3 tick delay, 2 jitter, 20% loss", {"delay": 3, "jitter": 2, "loss": 0.2}),
+		("8 tick delay, 10% loss", {"delay": 8, "loss": 0.1}),
+	]:
+		peers, t = rollback_match(n, **link_args)
+		p = peers[0]
+		report("%s, per tick" % name, t / n / 2 * 1e9)
+		print("  %-48s %10d frames, %d rolled back, %d stalls" % ("", p.f.frame, p.rollback_frames, p.stalls))
+
+@benchmark
+def input_codec():
+	from rollback import encode_inputs, decode_inputs
+
+	inputs = [tuple(int(c) for c in vals[0]) for vals in random_inputs(3000)]
+	held = [(0, 0, 0, 1, 0)] * 3000
+
+	for name, frames in [("changing inputs", inputs), ("held inputs", held)]:
+		for n in [1, 4, 10, 30]:
+			windows = [frames[i:i+n] for i in range(0, len(frames) - n, n)]
+			for w in windows:
+				if decode_inputs(encode_inputs(1234, 5678, w)) != (1234, 5678, w):
+					raise AssertionError("Input codec did not round trip.")
+
+			size = sum(len(encode_inputs(1234, 5678, w)) for w in windows) / len(windows)
+			# The previous format was two 4 byte frame numbers and a 1 byte count, then 5 bytes per frame.
+			print("  %-48s %6.1f bytes (was %d)" % ("%s, %d frames per message" % (name, n), size, 9 + 5*n))
+
+	w = inputs[:10]
+	data = encode_inputs(1234, 5678, w)
+	report("encode_inputs (10 frames)", ns_per_op(lambda: encode_inputs(1234, 5678, w), number=20000))
+	report("decode_inputs (10 frames)", ns_per_op(lambda: decode_inputs(data), number=20000))
+
+# Opens a server and client pair of asyncio transports over the loopback interface.
+async def transport_pair(udp):
+	import socket
+	from net import serve, connect
+
+	with socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		port = s.getsockname()[1]
+
+	server = asyncio.ensure_future(serve("127.0.0.1", port))
+	await asyncio.sleep(0.1)
+	client = await connect("127.0.0.1", port, udp=udp)
+	return await server, client
+
+# Returns the time in seconds each of n messages took to arrive, polling the receiver whenever the event loop is free.
+async def message_latency(a, b, n):
+	times = []
+	for i in range(n):
+		t = timeit.default_timer()
+		a.send(bytes(16))
+		while len(b.receive()) == 0:
+			await asyncio.sleep(0)
+		times.append(timeit.default_timer() - t)
+	return times
+
+# Plays n frames between two rollback sessions over a and b at the given tick rate.
+# Returns the time in seconds between each input being made and the remote peer receiving it, which is when it can apply it without predicting.
+async def input_to_apply(a, b, n, rate=60):
+	from rollback import rollback_session
+
+	peers = [rollback_session(standard_fight(), 0, a), rollback_session(standard_fight(), 1, b)]
+	inputs = random_inputs(n)
+	made = [{}, {}]
+	delays = []
+
+	loop = asyncio.get_running_loop()
+	next_tick = loop.time()
+	for i in range(n):
+		for p in range(2):
+			peer = peers[p]
+			confirmed = peer.remote_confirmed
+			made[p][peer.f.frame + peer.input_delay] = timeit.default_timer()
+			peer.advance(inputs[i][p])
+
+			now = timeit.default_timer()
+			for frame in range(confirmed + 1, peer.remote_confirmed + 1):
+				delays.append(now - made[1 - p][frame])
+
+		next_tick += 1 / rate
+		await asyncio.sleep(max(0, next_tick - loop.time()))
+	return delays
+
+@benchmark
+def transport_latency():
+	async def run(udp):
+		server, client = await transport_pair(udp)
+		kind = "UDP" if udp else "TCP"
+		if kind == "UDP" and type(client).__name__ != "udp_transport":
+			raise AssertionError("UDP connection fell back to TCP.")
+
+		times = sorted(await message_latency(client, server, 2000))
+		print("  %-48s %8.1f us p50 %8.1f us p99" % (kind + " message latency", profiler.percentile(times, 50) * 1e6, profiler.percentile(times, 99) * 1e6))
+
+		delays = sorted(await input_to_apply(server, client, 120))
+		print("  %-48s %8.2f ms p50 %8.2f ms p99" % (kind + " input-to-apply at 60 Hz", profiler.percentile(delays, 50) * 1e3, profiler.percentile(delays, 99) * 1e3))
+
+		server.close()
+		client.close()
+
+	asyncio.run(run(True))
+	asyncio.run(run(False))
+
+@benchmark
+def server_load():
+	import socket
+	from server import game_server, connect_clients, play
+
+	async def run(n_matches, n_ticks=90):
+		with socket.socket() as s:
+			s.bind(("127.0.0.1", 0))
+			port = s.getsockname()[1]
+
+		server = game_server()
+		await server.listen("127.0.0.1", port)
+		ticking = asyncio.ensure_future(server.run())
+
+		clients = await connect_clients("127.0.0.1", port, 2*n_matches)
+		await asyncio.sleep(0.2)
+		server.tick_times.clear()
+		await play(clients, n_ticks)
+
+		n, p50, p99, worst = server.stats()
+		ticking.cancel()
+		server.close()
+		for c in clients:
+			c.transport.close()
+		await asyncio.sleep(0.1)
+
+		if n != n_matches:
+			raise AssertionError("Server was hosting %d matches, not %d." % (n, n_matches))
+		for c in clients:
+			if c.player is None or c.snapshots < n_ticks // 2:
+				raise AssertionError("Client only got %d snapshots." % c.snapshots)
+
+		# Snapshots must restore into a fight built the same way.
+		f = standard_fight(deterministic=True)
+		f.restore(clients[0].snapshot())
+
+		print("  %-48s %6.2f ms p50 %6.2f ms p99 %6.2f ms max" % ("tick CPU time, %d matches" % n_matches, p50*1e3, p99*1e3, worst*1e3))
+		print("  %-48s %10.0f matches/core at 30 Hz" % ("", n_matches / (p50 * 30)))
+
+	for n_matches in [50, 100, 200]:
+		asyncio.run(run(n_matches))
+
+@benchmark
+def batch():
+	import os
+	import pickle
+	import batch
+
+	n_matches = 32
+	n_frames = 300
+	scripts = [brawl_inputs(n_frames, seed) for seed in range(n_matches)]
+
+	graph = len(pickle.dumps(jab_combo()))
+	job = len(pickle.dumps((batch.pack_script(scripts[0]), False)))
+	print("  %-48s %10d bytes" % ("pickled move graph (sent once per worker)", graph))
+	print("  %-48s %10d bytes" % ("pickled job (%d frame script)" % n_frames, job))
+
+	# That the pool gives the same results as playing each match here is tested by tests/test_batch.py.
+	batch.init_worker(jab_combo)
+	t = timeit.default_timer()
+	for s in scripts:
+		batch.run_job((batch.pack_script(s), False))
+	serial = timeit.default_timer() - t
+	report("serial, per match", serial / n_matches * 1e9)
+
+	for processes in sorted(set([1, 2, os.cpu_count()])):
+		t = timeit.default_timer()
+		batch.run_batch(jab_combo, scripts, processes=processes, chunksize=4)
+		t = timeit.default_timer() - t
+		report("%d processes, per match" % processes, t / n_matches * 1e9)
+		print("  %-48s %10.0f frames/s" % ("", n_matches * n_frames / t))
+
+@benchmark
+def replay():
+	import os
+	import tempfile
+	from replay import replay_writer, replay as open_replay
+
+	n = 9000
+	inputs = brawl_inputs(n)
+	path = os.path.join(tempfile.mkdtemp(), "match.rpl")
+
+	# Play the match once while recording it, keeping the true state at some frames to check seeking against.
+	f = standard_fight()
+	w = replay_writer(path, f)
+	rnd = random.Random(0)
+	checks = set(rnd.sample(range(n), 40)) | {0, n - 1}
+	truth = {}
+
+	t = timeit.default_timer()
+	for i in range(n):
+		for fi, vals in zip(f.fighters, inputs[i]):
+			fi.set_controls(vals)
+		if i in checks:
+			truth[i] = f.snapshot()
+		w.record()
+		f.update()
+	w.close()
+	t = timeit.default_timer() - t
+
+	size = os.path.getsize(path)
+	print("  %-48s %10d bytes, %.2f per frame" % ("replay of %d frames" % n, size, size / n))
+	report("record + update (per frame)", t / n * 1e9)
+
+	r = open_replay(path)
+	g = standard_fight()
+	for i in sorted(checks):
+		r.seek(g, i)
+		if g.snapshot() != truth[i]:
+			raise AssertionError("Seeking to frame %d did not reproduce the recorded state." % i)
+	r.close()
+
+	def seek_random():
+		r = open_replay(path)
+		g = standard_fight()
+		for i in rnd.sample(range(n), 20):
+			r.seek(g, i)
+		r.close()
+	report("seek to a random frame", ns_per_op(seek_random, number=1, repeat=3) / 20)
+
+	def play_to_random():
+		g = standard_fight()
+		g.simulate(rnd.randrange(n), inputs)
+	report("simulate from the start instead", ns_per_op(play_to_random, number=5, repeat=1))
+
+	def scan():
+		r = open_replay(path)
+		r.frames
+		r.close()
+	report("open a replay and read its length", ns_per_op(scan, number=1000))
+
+# Opens a window to render into, or an offscreen one if there is no display.
+def screen(w=1600, h=900):
+	import os
+	os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+	pg.init()
+	return pg.display.set_mode((w, h))
+
+@benchmark
+def debug_render():
+	s = screen()
+	f = crowd(50)
+	for p in stage(3).platforms:
+		f.add_platform(p.rect)
+
+	cam = camera((0, -450, 1600, 900), s)
+	cam.set_target_from_fight(f)
+	for i in range(100):
+		cam.render(f, debug=True)
+
+	report("camera.render(debug=True), 50 fighters", ns_per_op(lambda: cam.render(f, debug=True), number=20, repeat=3))
+	report("debug_rect with a label", ns_per_op(lambda: debug_rect(s, (180, 180, 40), pg.Rect(10, 10, 24, 75), "Fighter"), number=2000))
+	report("debug_rect with a truncated label", ns_per_op(lambda: debug_rect(s, (40, 40, 200), pg.Rect(10, 10, 30, 20), "Platform"), number=2000))
+
+@benchmark
+def scaled_render():
+	s = screen()
+	f = art_stage()
+
+	cam = camera((-800, -450, 1600, 900), s)
+	for i in range(100):
+		cam.render(f)
+	report("camera.render, still camera", ns_per_op(lambda: cam.render(f), number=50, repeat=3))
+
+	# Zoom slowly in and out, as the camera does when fighters move apart.
+	# With no room in the cache, every image is rescaled every frame, as if there were no cache.
+	for name, cache_bytes in [("", 64*1024*1024), (", nothing cached", 0)]:
+		cam = camera((-800, -450, 1600, 900), s, cache_bytes=cache_bytes)
+		frame = [0]
+		def zooming():
+			w = 1600 + 400 * math.sin(frame[0] / 30)
+			cam.set_target((-w/2, -w*9/32, w, w*9/16))
+			cam.render(f)
+			frame[0] += 1
+		report("camera.render, zooming camera" + name, ns_per_op(zooming, number=300, repeat=1))
+		if cache_bytes > 0:
+			print("  %-48s %10d bytes in %d surfaces" % ("scaled surface cache", cam.scaled.bytes, len(cam.scaled.surfaces)))
+
+@benchmark
+def culling():
+	s = screen()
+	for n in [100, 1000, 5000]:
+		f = stage(n)
+		cam = camera((-800, -450, 1600, 900), s)
+		report("camera.render(debug=True), %d platforms" % n, ns_per_op(lambda: cam.render(f, debug=True), number=10, repeat=3))
+
+# Moves the fighters of f back and forth, as if they were fighting in place.
+def shuffle_fighters(f, frame):
+	for i in range(len(f.fighters)):
+		f.fighters[i].pos.x = -200 + 400*i + 100 * math.sin(frame / 20 + i)
+
+# That dirty frames match full redraws is tested by tests/test_render.py.
+@benchmark
+def dirty_render():
+	s = screen()
+	f = art_stage()
+	cam = camera((-800, -450, 1600, 900), s)
+	for i in range(100):
+		cam.render(f)
+
+	frame = [0]
+	def full():
+		shuffle_fighters(f, frame[0])
+		s.fill((0, 0, 0))
+		cam.render(f, debug=True)
+		pg.display.flip()
+		frame[0] += 1
+	report("full redraw and flip", ns_per_op(full, number=100, repeat=3))
+
+	def dirty():
+		shuffle_fighters(f, frame[0])
+		pg.display.update(cam.render_dirty(f, debug=True))
+		frame[0] += 1
+	dirty()
+	report("render_dirty and update", ns_per_op(dirty, number=100, repeat=3))
+
+@benchmark
+def stage_layer():
+	s = screen()
+	for n in [1000, 5000]:
+		f = stage(n)
+		size = int((n**0.5) * 400)
+
+		# A view of a few platforms, and one of the whole stage.
+		for name, rect in [("close", (-800, -450, 1600, 900)), ("whole stage", (-size, -size*9//16, 2*size, 2*size*9//16))]:
+			for prerender in [False, True]:
+				cam = camera(rect, s, prerender=prerender)
+				frame = lambda: (s.fill((0, 0, 0)), cam.render(f))
+				if prerender:
+					# The layer clears the screen itself.
+					frame = lambda: cam.render(f)
+				frame()
+				report("%d platforms, %s, %s" % (n, name, "prerendered" if prerender else "direct"), ns_per_op(frame, number=10, repeat=3))
+
+		# Zoom slowly in and out of the whole stage, so that the layer is stretched most frames and redrawn every few.
+		for prerender in [False, True]:
+			cam = camera((-size, -size*9//16, 2*size, 2*size*9//16), s, prerender=prerender)
+			frame = [0]
+			def zooming():
+				w = 2*size * (1 + 0.3 * math.sin(frame[0] / 30))
+				cam.set_target((-w/2, -w*9/32, w, w*9/16))
+				if not prerender:
+					s.fill((0, 0, 0))
+				cam.render(f)
+				frame[0] += 1
+			report("%d platforms, zooming, %s" % (n, "prerendered" if prerender else "direct"), ns_per_op(zooming, number=200, repeat=1))
+
+# Stands in for drawing a frame that takes cost seconds of CPU time.
+def busy(cost):
+	import time
+	end = time.perf_counter() + cost
+	while time.perf_counter() < end:
+		pass
+
+# Plays a fight for seconds of real time with a render that takes render_cost seconds, and returns (simulation frames per second,
+# p50 and p99 of how far the simulation fell behind real time after each drawn frame, in seconds).
+# How far behind is measured from the least it ever was, so that a steady 30 frames per second is 0 throughout.
+# Lockstep simulates and draws one frame per tick of 30 per second, like test.py used to. Otherwise the simulation is
+# stepped by a clock.fixed_step at 30 per second, and frames are drawn at 60 per second.
+def sim_rate(render_cost, lockstep, seconds=1.5):
+	import time
+	from clock import fixed_step
+
+	f = standard_fight()
+	behind = []
+	sim = fixed_step(30)
+	rate = 30 if lockstep else 60
+
+	start = time.perf_counter()
+	next_frame = start
+	while time.perf_counter() - start < seconds:
+		if lockstep:
+			f.update()
+		else:
+			for i in range(sim.advance()):
+				f.update()
+		busy(render_cost)
+		behind.append(time.perf_counter() - start - f.frame / 30)
+
+		next_frame = max(next_frame + 1/rate, time.perf_counter())
+		time.sleep(max(0, next_frame - time.perf_counter()))
+
+	least = min(behind)
+	behind = sorted(b - least for b in behind)
+	return f.frame / (time.perf_counter() - start), profiler.percentile(behind, 50), profiler.percentile(behind, 99)
+
+@benchmark
+def fixed_timestep():
+	for cost in [0, 0.02, 0.05, 0.1]:
+		for lockstep in [True, False]:
+			rate, p50, p99 = sim_rate(cost, lockstep)
+			print("  %-48s %6.1f frames/s, behind by %6.1f ms p50, %6.1f ms p99" % (
+				"%s, %d ms render" % ("lockstep" if lockstep else "fixed step", cost*1000), rate, p50*1e3, p99*1e3))
+
+@benchmark
+def profiling():
+	import os
+	import tempfile
+	import profiler
+
+	s = screen()
+	f = crowd(50)
+	for p in stage(3).platforms:
+		f.add_platform(p.rect)
+	cam = camera((0, -450, 1600, 900), s)
+	cam.set_target_from_fight(f)
+
+	def frame():
+		f.update()
+		cam.render(f, debug=True)
+		if profiler.current is not None:
+			profiler.current.end_frame()
+
+	report("update + render, 50 fighters, profiler off", ns_per_op(frame, number=30, repeat=3))
+	prof = profiler.enable()
+	report("update + render, 50 fighters, profiler on", ns_per_op(frame, number=30, repeat=3))
+	report("remaking the overlay", ns_per_op(prof.render_overlay, number=30, repeat=3))
+	report("drawing the overlay", ns_per_op(lambda: prof.draw(s, 0, 20), number=30, repeat=3))
+	profiler.disable()
+
+	for phase, (p50, p99, mean, worst) in prof.stats().items():
+		print("  %-48s %8.3f ms p50, %8.3f ms p99" % (phase, p50*1e3, p99*1e3))
+
+	with tempfile.TemporaryDirectory() as d:
+		prof.dump_json(os.path.join(d, "profile.json"))
+		prof.dump_csv(os.path.join(d, "profile.csv"))
+		print("  %-48s %10d bytes JSON, %d bytes CSV" % ("dumps", os.path.getsize(os.path.join(d, "profile.json")), os.path.getsize(os.path.join(d, "profile.csv"))))
+
+# -------- Collision Suite --------
+# Times every collision routine on fixed inputs, hitting and missing, so that runs on different commits can be compared.
+# Every case checks that it hits or misses as named before it is timed.
+
+# Times f(), after checking that whether it returns None matches hit.
+def collision_case(name, f, hit, number=20000):
+	if (f() is not None) != hit:
+		raise AssertionError("Collision case \"%s\" should %s." % (name, "hit" if hit else "miss"))
+	report(name, ns_per_op(f, number=number))
+
+# Hitbox of n colliders along x, alternating between 10x10 rectangles and radius 5 circles, 20 units apart.
+# Points between colliders (x = 20i + 15, y = 5) are inside its bounds but miss every collider.
+def collision_row(n):
+	hb = Hitbox()
+	for i in range(n):
+		if i % 2 == 0:
+			hb.add_collider(Rectangle(i*20, 0, i*20 + 10, 10))
+		else:
+			hb.add_collider(Circle(i*20 + 5, 5, 5))
+	return hb
+
+# Small probe collider of type cls centered on (x, y).
+def collision_probe(cls, x, y):
+	if cls == Point:
+		return Point(x, y)
+	if cls == Rectangle:
+		return Rectangle(x - 1, y - 1, x + 1, y + 1)
+	return Circle(x, y, 1)
+
+@benchmark
+def collision():
+	# The kernels, with floats and, where they differ, with fixed point integers.
+	kernels = [
+		("collide_point_point", collide_point_point, (0, 0, 0, 0), (0, 0, 1, 0)),
+		("collide_rect_point", collide_rect_point, (-5, -5, 5, 5, 1, 2), (-5, -5, 5, 5, 10, 2)),
+		("collide_rect_rect", collide_rect_rect, (0, 0, 10, 10, 5, 5, 15, 15), (0, 0, 10, 10, 20, 0, 30, 10)),
+		("collide_rect_circle", collide_rect_circle, (0, 0, 10, 10, 12, 5, 3), (0, 0, 10, 10, 20, 5, 3)),
+		("collide_circle_point", collide_circle_point, (0, 0, 5, 1, 2), (0, 0, 5, 10, 0)),
+		("collide_circle_circle", collide_circle_circle, (0, 0, 5, 6, 0, 3), (0, 0, 5, 20, 0, 3)),
+	]
+	for name, f, hit, miss in kernels:
+		collision_case(name + ", hit", lambda: f(*hit), True)
+		collision_case(name + ", miss", lambda: f(*miss), False)
+		if "circle" in name:
+			fixed_hit = tuple(v * FIXED_ONE for v in hit)
+			collision_case(name + ", hit, fixed point", lambda: f(*fixed_hit, fixed=True), True)
+
+	# Every pair of primitives through their methods. a is at the origin, and b either overlaps the origin or is far away.
+	method = {Point: "collide_point", Rectangle: "collide_rectangle", Circle: "collide_circle"}
+	a_at = {Point: Point(0, 0), Rectangle: Rectangle(-5, -5, 5, 5), Circle: Circle(0, 0, 5)}
+	b_hit = {Point: Point(0, 0), Rectangle: Rectangle(-1, -1, 9, 9), Circle: Circle(2, 0, 4)}
+	b_miss = {Point: Point(100, 0), Rectangle: Rectangle(100, 0, 110, 10), Circle: Circle(100, 0, 4)}
+	for A in method:
+		for B in method:
+			f = getattr(a_at[A], method[B])
+			name = "%s.%s(%s)" % (A.__name__, method[B], B.__name__)
+			collision_case(name + ", hit", lambda: f(b_hit[B]), True)
+			collision_case(name + ", miss", lambda: f(b_miss[B]), False)
+
+	# Hitboxes of each size against each probe: hitting the first or last collider, missing inside the bounds, and missing outside of them.
+	for n in [1, 4, 16, 64]:
+		hb = collision_row(n)
+		number = max(1000, 20000 // n)
+		last = ((n - 1) * 20 + 5, 5)
+		for cls in method:
+			f = getattr(hb, method[cls])
+			name = "Hitbox(%d).%s" % (n, method[cls])
+			first, last_probe, between, outside = [collision_probe(cls, *at) for at in [(5, 5), last, (15, 5), (5, 100)]]
+			collision_case(name + ", hit first", lambda: f(first), True, number)
+			collision_case(name + ", hit last", lambda: f(last_probe), True, number)
+			if n > 1:
+				collision_case(name + ", miss in bounds", lambda: f(between), False, number)
+			collision_case(name + ", miss out of bounds", lambda: f(outside), False, number)
+
+		# Against a hitbox of n small rectangles between its colliders, which must test all n*n pairs to miss.
+		comb = Hitbox([Rectangle(i*20 + 14, 4, i*20 + 16, 6) for i in range(n)])
+		first = Hitbox(collision_probe(Rectangle, 5, 5))
+		outside = Hitbox(collision_probe(Rectangle, 5, 100))
+		collision_case("Hitbox(%d).collide_hitbox, hit first" % n, lambda: hb.collide_hitbox(first), True, number)
+		if n > 1:
+			collision_case("Hitbox(%d).collide_hitbox, miss in bounds" % n, lambda: hb.collide_hitbox(comb), False, max(100, number // n))
+		collision_case("Hitbox(%d).collide_hitbox, miss out of bounds" % n, lambda: hb.collide_hitbox(outside), False, number)
+
+		# The same with NumPy, converting both hitboxes to arrays on every call like Hitbox.collide_hitbox_batch() does.
+		collision_case("Hitbox(%d).collide_hitbox_batch, hit first" % n, lambda: hb.collide_hitbox_batch(first), True, 500)
+		if n > 1:
+			collision_case("Hitbox(%d).collide_hitbox_batch, miss in bounds" % n, lambda: hb.collide_hitbox_batch(comb), False, 500)
+		collision_case("Hitbox(%d).collide_hitbox_batch, miss out of bounds" % n, lambda: hb.collide_hitbox_batch(outside), False, 500)
+
+		# Single colliders against the hitbox, from the collider's side.
+		for cls in [Rectangle, Circle]:
+			name = "%s.collide_hitbox(Hitbox(%d))" % (cls.__name__, n)
+			c_first, c_between, c_outside = [collision_probe(cls, *at) for at in [(5, 5), (15, 5), (5, 100)]]
+			collision_case(name + ", hit", lambda: c_first.collide_hitbox(hb), True, number)
+			if n > 1:
+				collision_case(name + ", miss in bounds", lambda: c_between.collide_hitbox(hb), False, number)
+			collision_case(name + ", miss out of bounds", lambda: c_outside.collide_hitbox(hb), False, number)
+
+		# The transformed versions, which skip the bounds test, mirrored and moved.
+		probe = Rectangle(-1, -1, 1, 1)
+		origin = vec2(0, 0)
+		hit_at = vec2(-5, 5)
+		miss_at = vec2(-5, 100)
+		collision_case("Hitbox(%d).collide_collider_at, hit" % n, lambda: hb.collide_collider_at(-1, origin, probe, 1, hit_at), True, number)
+		collision_case("Hitbox(%d).collide_collider_at, miss" % n, lambda: hb.collide_collider_at(-1, origin, probe, 1, miss_at), False, number)
+		probe_hb = Hitbox(probe)
+		collision_case("Hitbox(%d).collide_hitbox_at, hit" % n, lambda: hb.collide_hitbox_at(-1, origin, probe_hb, 1, hit_at), True, number)
+		collision_case("Hitbox(%d).collide_hitbox_at, miss one collider" % n, lambda: hb.collide_hitbox_at(-1, origin, probe_hb, 1, miss_at), False, number)
+		if n > 1:
+			collision_case("Hitbox(%d).collide_hitbox_at, miss" % n, lambda: hb.collide_hitbox_at(1, origin, comb), False, max(100, number // n))
+
+	# Copies, lerps and bounds.
+	for c in [Point(1, 2), Rectangle(0, 0, 10, 10), Circle(0, 0, 5)]:
+		report("%s.copy" % type(c).__name__, ns_per_op(c.copy, number=20000))
+	other = {Point: Point(5, 6), Rectangle: Rectangle(5, 5, 20, 20), Circle: Circle(5, 5, 8)}
+	report("lerp", ns_per_op(lambda: lerp(1.0, 5.0, 0.25), number=20000))
+	for c in [Point(1, 2), Rectangle(0, 0, 10, 10), Circle(0, 0, 5)]:
+		b = other[type(c)]
+		report("%s.lerp" % type(c).__name__, ns_per_op(lambda: c.lerp(b, 0.25), number=20000))
+		report("%s.bounds_at" % type(c).__name__, ns_per_op(lambda: c.bounds_at(-1, 3, 4), number=20000))
+
+	for n in [1, 4, 16, 64]:
+		hb = collision_row(n)
+		number = max(1000, 20000 // n)
+		report("Hitbox(%d).copy" % n, ns_per_op(hb.copy, number=number))
+		report("Hitbox(%d).bounds, cached" % n, ns_per_op(hb.bounds, number=20000))
+
+		def uncached():
+			hb._bounds = None
+			return hb.bounds()
+		report("Hitbox(%d).bounds, uncached" % n, ns_per_op(uncached, number=number))
+		report("Hitbox(%d).bounds_at" % n, ns_per_op(lambda: hb.bounds_at(-1, 3, 4), number=number))
+
+# Writes results to path as JSON, along with what they were measured on.
+def save_results(path):
+	import json
+	import platform
+	import subprocess
+	import datetime
+
+	try:
+		commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		commit = None
+
+	data = {
+		"commit": commit,
+		"time": datetime.datetime.now().isoformat(timespec="seconds"),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"unit": "ns/op",
+		"results": results,
+	}
+	with open(path, "w") as f:
+		json.dump(data, f, indent=1)
+
+# Prints how every time in results compares to the same one in the JSON file at path. Times more than threshold slower are marked.
+def compare_results(path, threshold=0.1):
+	import json
+	with open(path) as f:
+		old = json.load(f)
+
+	print("compared to %s (commit %s):" % (path, old.get("commit")))
+	for bench, times in results.items():
+		for name, ns in times.items():
+			before = old["results"].get(bench, {}).get(name)
+			if before is None or before == 0:
+				continue
+			ratio = ns / before
+			mark = "  slower" if ratio > 1 + threshold else ("  faster" if ratio < 1 - threshold else "")
+			print("  %-60s %10.1f -> %10.1f ns/op %6.2fx%s" % (bench + ": " + name, before, ns, ratio, mark))
+
+if __name__ == "__main__":
+	import argparse
+	parser = argparse.ArgumentParser()
+	parser.add_argument("names", nargs="*", help="benchmarks to run, or all of them if none are given")
+	parser.add_argument("--json", help="save the results to this JSON file")
+	parser.add_argument("--compare", help="compare the results to this JSON file from an earlier run")
+	args = parser.parse_args()
+
+	names = args.names if len(args.names) > 0 else list(benchmarks)
+	for name in names:
+		if name not in benchmarks:
+			print("Unknown benchmark \"%s\". Available: %s" % (name, ", ".join(benchmarks)))
+			exit()
+
+	for name in names:
+		print(name + ":")
+		running = name
+		benchmarks[name]()
+
+	if args.json is not None:
+		save_results(args.json)
+	if args.compare is not None:
+		compare_results(args.compare)
@@ -0,0 +1,50 @@
+import time
+
+# Fixed timestep for running a simulation at a steady rate, whatever rate frames are drawn at.
+# Every displayed frame, call advance() and run as many simulation steps as it returns, then draw with blend() to interpolate
+# between the last two steps (see camera.render()). The simulation then averages rate steps per second, however fast or slow drawing is.
+# If drawing falls so far behind that more than max_steps steps are due at once, the time past that is dropped,
+# so the simulation slows down instead of spending ever longer catching up.
+# clock is the function returning the current time in seconds.
+class fixed_step:
+	def __init__(self, rate=30, max_steps=5, clock=time.perf_counter):
+		self.rate = rate
+		self.dt = 1 / rate
+		self.max_steps = max_steps
+		self.clock = clock
+
+		# Time of the last advance(), and the time since then not yet simulated, in seconds.
+		self.last = None
+		self.accumulator = 0
+
+		# Steps run so far, and seconds dropped for falling behind.
+		self.steps = 0
+		self.dropped = 0
+
+	# Returns the number of steps to run for the time since the last call. The first call starts the clock and returns 0.
+	def advance(self):
+		now = self.clock()
+		if self.last is None:
+			self.last = now
+			return 0
+
+		self.accumulator += now - self.last
+		self.last = now
+
+		n = int(self.accumulator // self.dt)
+		if n > self.max_steps:
+			self.dropped += (n - self.max_steps) * self.dt
+			self.accumulator -= (n - self.max_steps) * self.dt
+			n = self.max_steps
+
+		self.accumulator -= n * self.dt
+		self.steps += n
+		return n
+
+	# Returns the fraction of the time between steps that has passed since the last one, from 0 up to 1.
+	def blend(self):
+		return min(1, self.accumulator / self.dt)
+
+	# Returns the seconds until the next step is due, as of the last advance().
+	def until_next(self):
+		return self.dt - self.accumulator
@@ -1,3 +1,4 @@
+import math
 import pygame as pg
 
 # This library implements a quick vec2 class, primitive rect, circle, and point classes, 
@@ -9,7 +10,11 @@ import pygame as pg
 def lerp(a, b, t):
 	return (b-a)*t+a
 
+# Slotted so that the many short-lived vectors made per frame stay small and cheap to create.
+# Methods ending in an underscore modify the vector in place and return it, which lets hot code avoid temporaries.
 class vec2:
+	__slots__ = ("x", "y")
+
 	def __init__(self, x, y):
 		self.x = x
 		self.y = y
@@ -18,7 +23,7 @@ class vec2:
 		return self.x*self.x + self.y*self.y
 
 	def mag(self):
-		return self.sqr_mag()**0.5
+		return (self.x*self.x + self.y*self.y)**0.5
 
 	def normalize(self, new_mag=1):
 		if new_mag == 0:
@@ -26,6 +31,50 @@ class vec2:
 		m = self.mag() / new_mag
 		return vec2(self.x / m, self.y / m)
 
+	def dot(self, othr):
+		return self.x*othr.x + self.y*othr.y
+
+	# Z component of the 3D cross product.
+	def cross(self, othr):
+		return self.x*othr.y - self.y*othr.x
+
+	def scale(self, s):
+		return vec2(self.x * s, self.y * s)
+
+	def copy(self):
+		return vec2(self.x, self.y)
+
+	# In-place variants
+	def set(self, x, y):
+		self.x = x
+		self.y = y
+		return self
+
+	def iadd(self, othr):
+		self.x += othr.x
+		self.y += othr.y
+		return self
+
+	def isub(self, othr):
+		self.x -= othr.x
+		self.y -= othr.y
+		return self
+
+	def scale_(self, s):
+		self.x *= s
+		self.y *= s
+		return self
+
+	def normalize_(self, new_mag=1):
+		if new_mag == 0:
+			self.x = 0
+			self.y = 0
+			return self
+		m = self.mag() / new_mag
+		self.x /= m
+		self.y /= m
+		return self
+
 	# Overloads
 	def __str__(self):
 		return "<vec2(%.2f, %.2f)>" % (self.x, self.y)
@@ -64,18 +113,18 @@ class vec2:
 	def __neg__(self):
 		return vec2(-self.x, -self.y)
 
-	# Comparisons
+	# Comparisons (By magnitude)
 	def __lt__(self, othr):
-		return self.sqr_mag() < othr.sqr_mag()
+		return self.x*self.x + self.y*self.y < othr.x*othr.x + othr.y*othr.y
 
 	def __gt__(self, othr):
-		return self.sqr_mag() > othr.sqr_mag()
+		return self.x*self.x + self.y*self.y > othr.x*othr.x + othr.y*othr.y
 
 	def __le__(self, othr):
-		return self.sqr_mag() <= othr.sqr_mag()
+		return self.x*self.x + self.y*self.y <= othr.x*othr.x + othr.y*othr.y
 
 	def __ge__(self, othr):
-		return self.sqr_mag() >= othr.sqr_mag()
+		return self.x*self.x + self.y*self.y >= othr.x*othr.x + othr.y*othr.y
 
 	def __eq__(self, othr):
 		return self.x == othr.x and self.y == othr.y
@@ -83,15 +132,107 @@ class vec2:
 	def __ne__(self, othr):
 		return self.x != othr.x or self.y != othr.y
 
+# Returns the shortest of the axis-aligned vectors (dx1, 0), (dx2, 0), (0, dy1), (0, dy2).
+# Equivalent to calling min() on those four vectors, including its preference for the earliest on ties, but only allocates the result.
+def min_axis(dx1, dx2, dy1, dy2):
+	x = dx1
+	m = dx1*dx1
+	if dx2*dx2 < m:
+		x = dx2
+		m = dx2*dx2
+	if dy1*dy1 < m:
+		if dy2*dy2 < dy1*dy1:
+			return vec2(0, dy2)
+		return vec2(0, dy1)
+	if dy2*dy2 < m:
+		return vec2(0, dy2)
+	return vec2(x, 0)
+
+# Returns the vector (cdx, cdy) scaled to length r minus its own length, which pushes a circle out along it. It must not be the zero vector.
+# If fixed is True, the coordinates are integers in fixed point and only integer math is used, so the result is the same on every machine.
+# The length is rounded down by isqrt() and the result toward negative infinity.
+def push_out(cdx, cdy, r, fixed=False):
+	if fixed:
+		d = math.isqrt(cdx*cdx + cdy*cdy)
+		n = r - d
+		return vec2(cdx * n // d, cdy * n // d)
+
+	cdm = vec2(cdx, cdy)
+	return cdm.normalize_(r - cdm.mag())
+
+# -------- Collision Kernels --------
+# The math behind every collision test, on raw coordinates so that colliders don't have to be copied and moved to be tested.
+# Rectangles are passed as (mx, my, Mx, My), circles as (x, y, r), and points as (x, y).
+# Each returns the resolution vector that moves the first shape out of the second, or None if they don't touch.
+# Kernels which take fixed work on integer fixed point coordinates when it is True. See push_out().
+
+def collide_point_point(ax, ay, bx, by):
+	if bx == ax and by == ay:
+		return vec2(0, 0)
+	return None
+
+def collide_rect_point(mx, my, Mx, My, x, y):
+	if x >= mx and x <= Mx and y >= my and y <= My:
+		return min_axis(x - mx, x - Mx, y - my, y - My)
+	return None
+
+def collide_rect_rect(amx, amy, aMx, aMy, bmx, bmy, bMx, bMy):
+	if aMx < bmx or aMy < bmy or amx > bMx or amy > bMy:
+		return None
+	return min_axis(bmx - aMx, bMx - amx, bmy - aMy, bMy - amy)
+
+def collide_rect_circle(mx, my, Mx, My, x, y, r, fixed=False):
+	cdx = min(Mx, max(mx, x)) - x
+	cdy = min(My, max(my, y)) - y
+
+	# Generate collision resolution for when the center of the circle is inside or touching the rectangle
+	if cdx == 0 and cdy == 0:
+		return min_axis(x - mx + r, x - Mx - r, y - my + r, y - My - r)
+
+	# Generate collision resolution for when the center of the circle is outside the rectangle
+	if cdx*cdx + cdy*cdy <= r*r:
+		return push_out(cdx, cdy, r, fixed)
+	return None
+
+def collide_circle_point(x, y, r, px, py, fixed=False):
+	cdx = x - px
+	cdy = y - py
+	
+	# Generate default resolution when point is at circle center
+	if cdx == 0 and cdy == 0:
+		return vec2(0, -r)
+
+	# Generate collision resolution normally otherwise.
+	if cdx*cdx + cdy*cdy <= r*r:
+		return push_out(cdx, cdy, r, fixed)
+	return None
+
+def collide_circle_circle(ax, ay, ar, bx, by, br, fixed=False):
+	cdx = ax - bx
+	cdy = ay - by
+	r_sum = ar + br
+
+	if cdx == 0 and cdy == 0:
+		return vec2(0, -r_sum)
+
+	if cdx*cdx + cdy*cdy <= r_sum*r_sum:
+		return push_out(cdx, cdy, r_sum, fixed)
+	return None
+
 # -------- Collider & Hitbox Classes --------
 # Each collider class defines a function for testing collision with all other classes
 # The current primitive colliders are Points, Rectangles, and Circles
 # Hitboxes are lists of primitive colliders.
 # All collision testing functions return a collision object which contains the collision resolution vector.
 # The vector moves the calling object so that it is touching but not intersecting the passed object.
+# Colliders can also be tested in place as if they were flipped and moved. See collide_placed() and Hitbox.collide_hitbox_at().
+
+# All of these classes are slotted. Hitboxes are copied and moved every frame, so small, fast-to-create colliders matter.
 
 # Collision object returned by a collision
 class Collision:
+	__slots__ = ("a", "b", "r")
+
 	def __init__(self, collider_a, collider_b, resolution):
 		self.a = collider_a
 		self.b = collider_b
@@ -103,13 +244,15 @@ class Collision:
 		self.a = self.b
 		self.b = tmp
 
-		self.r = -self.r
+		self.r.scale_(-1)
 
 	def __str__(self):
 		return "<Collision(" + str(self.a) + ", " + str(self.b) + ", " + str(self.r) + ")>"
 
 # Class for holding Points.
 class Point:
+	__slots__ = ("x", "y")
+
 	def __init__(self, x, y):
 		self.x = x
 		self.y = y
@@ -133,6 +276,10 @@ class Point:
 	def lerp(a, b, t):
 		return Point(lerp(a.x, b.x, t), lerp(a.y, b.y, t))
 
+	# Returns a copy with every coordinate multiplied by s and rounded to an integer. Used to convert colliders to fixed point.
+	def scaled(self, s):
+		return Point(round(self.x * s), round(self.y * s))
+
 	def left(self):
 		return self.x
 	
@@ -145,11 +292,22 @@ class Point:
 	def bottom(self):
 		return self.y
 
+	# Returns the coordinates this collider's collision kernel takes, after being flipped along x if facing is -1 and then moved by (x, y).
+	# Rounds exactly like copying, flipping and moving the collider would.
+	def placed(self, facing, x, y):
+		return ((self.x if facing == 1 else -self.x) + x, self.y + y)
+
+	# Returns (left, top, right, bottom) of this collider after being flipped along x if facing is -1 and then moved by (x, y).
+	def bounds_at(self, facing, x, y):
+		px = (self.x if facing == 1 else -self.x) + x
+		py = self.y + y
+		return px, py, px, py
+
 	def collide_point(self, h):
-		hit = h.x == self.x and h.y == self.y
-		if hit:
-			return Collision(self, h, vec2(0, 0)) 
-		return None
+		r = collide_point_point(self.x, self.y, h.x, h.y)
+		if r is None:
+			return None
+		return Collision(self, h, r)
 	
 	def collide_rectangle(self, h):
 		col = h.collide_point(self)
@@ -166,6 +324,8 @@ class Point:
 # Class for holding Rectangles. Used in hitboxes along with Circles 
 # Not to be confused with pygame.Rect
 class Rectangle:
+	__slots__ = ("mx", "my", "Mx", "My")
+
 	def __init__(self, x1, y1, x2, y2):
 		self.mx = x1
 		self.my = y1
@@ -199,8 +359,8 @@ class Rectangle:
 
 	def flip_y(self):
 		temp = -self.My
-		self.My = -self.mx
-		self.mx = temp
+		self.My = -self.my
+		self.my = temp
 
 	def copy(self):
 		return Rectangle(self.mx, self.my, self.Mx, self.My)
@@ -208,6 +368,9 @@ class Rectangle:
 	def lerp(a, b, t):
 		return Rectangle(lerp(a.mx, b.mx, t), lerp(a.my, b.my, t), lerp(a.Mx, b.Mx, t), lerp(a.My, b.My, t))
 
+	def scaled(self, s):
+		return Rectangle(round(self.mx * s), round(self.my * s), round(self.Mx * s), round(self.My * s))
+
 	def left(self):
 		return self.mx
 
@@ -226,55 +389,31 @@ class Rectangle:
 	def height(self):
 		return self.My - self.my
 
+	def placed(self, facing, x, y):
+		if facing == 1:
+			return (self.mx + x, self.my + y, self.Mx + x, self.My + y)
+		return (-self.Mx + x, self.my + y, -self.mx + x, self.My + y)
+
+	def bounds_at(self, facing, x, y):
+		return self.placed(facing, x, y)
+
 	def collide_point(self, h):
-		hit = h.x >= self.mx and h.x <= self.Mx and h.y >= self.my and h.y <= self.My
-		if hit:
-			return Collision(
-				self, h,
-				min(
-					vec2(h.x - self.mx, 0),
-					vec2(h.x - self.Mx, 0),
-					vec2(0, h.y - self.my),
-					vec2(0, h.y - self.My)
-				)
-			)
-		return None
+		r = collide_rect_point(self.mx, self.my, self.Mx, self.My, h.x, h.y)
+		if r is None:
+			return None
+		return Collision(self, h, r)
 
 	def collide_rectangle(self, h):
-		hit = not (self.Mx < h.mx or self.My < h.my or self.mx > h.Mx or self.my > h.My)
-		if hit:
-			return Collision(
-				self, h,
-				min(
-					vec2(h.mx - self.Mx, 0),
-					vec2(h.Mx - self.mx, 0),
-					vec2(0, h.my - self.My),
-					vec2(0, h.My - self.my)
-				)
-			)
-		return None
+		r = collide_rect_rect(self.mx, self.my, self.Mx, self.My, h.mx, h.my, h.Mx, h.My)
+		if r is None:
+			return None
+		return Collision(self, h, r)
 
 	def collide_circle(self, h):
-		cdx = min(self.Mx, max(self.mx, h.x)) - h.x
-		cdy = min(self.My, max(self.my, h.y)) - h.y
-
-		# Generate collision resolution for when the center of the circle is inside or touching the rectangle
-		if cdx == 0 and cdy == 0:
-			return Collision(
-				self, h,
-				min(
-					vec2(h.x - self.mx + h.r, 0),
-					vec2(h.x - self.Mx - h.r, 0),
-					vec2(0, h.y - self.my + h.r),
-					vec2(0, h.y - self.My - h.r)
-				)
-			)
-
-		# Generate collision resolution for when the center of the circle is outside the rectangle
-		hit = cdx*cdx + cdy*cdy <= h.r*h.r
-		if hit:
-			return Collision(self, h, vec2(cdx, cdy).normalize(h.r - vec2(cdx, cdy).mag()))
-		return None
+		r = collide_rect_circle(self.mx, self.my, self.Mx, self.My, h.x, h.y, h.r)
+		if r is None:
+			return None
+		return Collision(self, h, r)
 
 	def collide_hitbox(self, h):
 		col = h.collide_rectangle(self)
@@ -284,6 +423,8 @@ class Rectangle:
 
 # Circle Class. Used in hitboxes along with Rectangles 
 class Circle:
+	__slots__ = ("x", "y", "r")
+
 	def __init__(self, x, y, r):
 		self.x = x
 		self.y = y
@@ -308,6 +449,9 @@ class Circle:
 	def lerp(a, b, t):
 		return Circle(lerp(a.x, b.x, t), lerp(a.y, b.y, t), lerp(a.r, b.r, t))
 
+	def scaled(self, s):
+		return Circle(round(self.x * s), round(self.y * s), round(self.r * s))
+
 	def left(self):
 		return self.x - self.r
 
@@ -320,20 +464,19 @@ class Circle:
 	def bottom(self):
 		return self.y + self.r
 
+	def placed(self, facing, x, y):
+		return ((self.x if facing == 1 else -self.x) + x, self.y + y, self.r)
+
+	def bounds_at(self, facing, x, y):
+		cx = (self.x if facing == 1 else -self.x) + x
+		cy = self.y + y
+		return cx - self.r, cy - self.r, cx + self.r, cy + self.r
+
 	def collide_point(self, h):
-		cdx = self.x - h.x
-		cdy = self.y - h.y
-		
-		# Generate default resolution when point is at circle center
-		if cdx == 0 and cdy == 0:
-			return Collision(self, h, vec2(0, -self.r))
-
-		# Generate collision resolution normally otherwise.
-		hit = cdx*cdx + cdy*cdy <= self.r*self.r
-		if hit:
-			cdm = vec2(cdx, cdy)
-			return Collision(self, h, cdm.normalize(self.r - cdm.mag()))
-		return None
+		r = collide_circle_point(self.x, self.y, self.r, h.x, h.y)
+		if r is None:
+			return None
+		return Collision(self, h, r)
 
 	def collide_rectangle(self, h):
 		col = h.collide_circle(self)
@@ -342,18 +485,10 @@ class Circle:
 		return col
 
 	def collide_circle(self, h):
-		cdx = self.x - h.x
-		cdy = self.y - h.y
-		r_sum = self.r + h.r
-
-		if cdx == 0 and cdy == 0:
-			return Collision(self, h, vec2(0, -r_sum))
-
-		hit = cdx*cdx + cdy*cdy <= r_sum*r_sum
-		if hit:
-			cdm = vec2(cdx, cdy)
-			return Collision(self, h, cdm.normalize(r_sum - cdm.mag()))
-		return None
+		r = collide_circle_circle(self.x, self.y, self.r, h.x, h.y, h.r)
+		if r is None:
+			return None
+		return Collision(self, h, r)
 
 	def collide_hitbox(self, h):
 		col = h.collide_circle(self)
@@ -361,10 +496,56 @@ class Circle:
 			col.swap()
 		return col
 
+# Collides collider a with collider b, given the coordinates a.placed() and b.placed() returned for them.
+# Gives the same result as a.collide_<type of b>(b) on transformed copies of a and b, but the Collision references a and b themselves.
+# If fixed is True, the coordinates are integer fixed point. See push_out().
+def collide_placed(a, pa, b, pb, fixed=False):
+	ta = type(a)
+	tb = type(b)
+	swap = False
+
+	if ta == Rectangle:
+		if tb == Rectangle:
+			r = collide_rect_rect(*pa, *pb)
+		elif tb == Circle:
+			r = collide_rect_circle(*pa, *pb, fixed)
+		else:
+			r = collide_rect_point(*pa, *pb)
+	elif ta == Circle:
+		if tb == Rectangle:
+			r = collide_rect_circle(*pb, *pa, fixed)
+			swap = True
+		elif tb == Circle:
+			r = collide_circle_circle(*pa, *pb, fixed)
+		else:
+			r = collide_circle_point(*pa, *pb, fixed)
+	else:
+		if tb == Rectangle:
+			r = collide_rect_point(*pb, *pa)
+			swap = True
+		elif tb == Circle:
+			r = collide_circle_point(*pb, *pa, fixed)
+			swap = True
+		else:
+			r = collide_point_point(*pa, *pb)
+
+	if r is None:
+		return None
+	if swap:
+		r.scale_(-1)
+	return Collision(a, b, r)
+
 # Class for holding a hitbox. This is a collection of rectangles and circles.
+# The bounding box of the hitbox is cached. move(), flip_x(), flip_y() and add_collider() keep it up to date,
+# so colliders in a hitbox should only be modified through those functions.
 class Hitbox:
+	__slots__ = ("colliders", "_bounds")
+
 	def __init__(self, colliders=None):
 		self.colliders = []
+
+		# Cached (left, top, right, bottom) of all colliders, or None if it must be recalculated.
+		self._bounds = None
 		if colliders is not None:
 			try:
 				for c in colliders:
@@ -380,63 +561,97 @@ class Hitbox:
 				s = s + ", " + str(c)
 		return s + ")>"
 
+	# Moving invalidates the bounds rather than translating them, because the bounds of a moved circle (x + d - r)
+	# can differ in the last bit from the translated bounds (x - r + d).
 	def move(self, d):
 		for c in self.colliders:
 			c.move(d)
+		self._bounds = None
 
 	def flip_x(self):
 		for c in self.colliders:
 			c.flip_x()
+		if self._bounds is not None:
+			l, t, r, b = self._bounds
+			self._bounds = (-r, t, -l, b)
 	
 	def flip_y(self):
 		for c in self.colliders:
 			c.flip_y()
+		if self._bounds is not None:
+			l, t, r, b = self._bounds
+			self._bounds = (l, -b, r, -t)
 
+	# The colliders of an existing hitbox have already been validated, so they are copied directly rather than through add_collider().
 	def copy(self):
 		hb = Hitbox()
-		for c in self.colliders:
-			hb.add_collider(c.copy())
+		hb.colliders = [c.copy() for c in self.colliders]
+		hb._bounds = self._bounds
 		return hb
 
+	# Returns a copy with every collider scaled by s. See Point.scaled().
+	def scaled(self, s):
+		return Hitbox([c.scaled(s) for c in self.colliders])
+
 	def add_collider(self, c):
 		if type(c) != Rectangle and type(c) != Circle and type(c) != Point:
 			raise TypeError("Attmpted to add non-collider object to hitbox.")
 		self.colliders.append(c.copy())
 
+		if self._bounds is not None:
+			l, t, r, b = self._bounds
+			self._bounds = (min(l, c.left()), min(t, c.top()), max(r, c.right()), max(b, c.bottom()))
+
+	# Returns the bounding box of all colliders as a (left, top, right, bottom) tuple, or None if there are no colliders.
+	def bounds(self):
+		if self._bounds is None and len(self.colliders) > 0:
+			c = self.colliders[0]
+			l, t, r, b = c.left(), c.top(), c.right(), c.bottom()
+			for c in self.colliders[1:]:
+				l = min(l, c.left())
+				t = min(t, c.top())
+				r = max(r, c.right())
+				b = max(b, c.bottom())
+			self._bounds = (l, t, r, b)
+		return self._bounds
+
 	def left(self):
-		if len(self.colliders) == 0:
-			return None
-		m = self.colliders[0].left()
-		for c in self.colliders[1:]:
-			m = min(m, c.left())
-		return m
+		b = self.bounds()
+		return None if b is None else b[0]
 
 	def right(self):
-		if len(self.colliders) == 0:
-			return None
-		m = self.colliders[0].right()
-		for c in self.colliders[1:]:
-			m = max(m, c.right())
-		return m
+		b = self.bounds()
+		return None if b is None else b[2]
 
 	def top(self):
-		if len(self.colliders) == 0:
-			return None
-		m = self.colliders[0].top()
-		for c in self.colliders[1:]:
-			m = min(m, c.top())
-		return m
+		b = self.bounds()
+		return None if b is None else b[1]
 
 	def bottom(self):
+		b = self.bounds()
+		return None if b is None else b[3]
+
+	# Returns (left, top, right, bottom) of this hitbox after being flipped along x if facing is -1 and then moved by (x, y), or None if it is empty.
+	# Unlike bounds(), this isn't cached, but rounds exactly like moving the colliders would, so it can be used to conservatively reject collisions.
+	def bounds_at(self, facing, x, y):
 		if len(self.colliders) == 0:
 			return None
-		m = self.colliders[0].bottom()
+		l, t, r, b = self.colliders[0].bounds_at(facing, x, y)
 		for c in self.colliders[1:]:
-			m = max(m, c.bottom())
-		return m
+			cl, ct, cr, cb = c.bounds_at(facing, x, y)
+			l = min(l, cl)
+			t = min(t, ct)
+			r = max(r, cr)
+			b = max(b, cb)
+		return l, t, r, b
 
 	# Colliding hitboxes against primitives returns the index in self.colliders of the collider that first hit.
+	# Each first rejects colliders that lie outside of the bounding box of the hitbox.
 	def collide_point(self, h):
+		b = self.bounds()
+		if b is None or h.x < b[0] or h.y < b[1] or h.x > b[2] or h.y > b[3]:
+			return None
+
 		for c in range(len(self.colliders)):
 			col = self.colliders[c].collide_point(h)
 			if col is not None:
@@ -444,6 +659,10 @@ class Hitbox:
 		return None
 
 	def collide_circle(self, h):
+		b = self.bounds()
+		if b is None or h.x + h.r < b[0] or h.y + h.r < b[1] or h.x - h.r > b[2] or h.y - h.r > b[3]:
+			return None
+
 		for c in range(len(self.colliders)):
 			col = self.colliders[c].collide_circle(h)
 			if col is not None:
@@ -451,6 +670,10 @@ class Hitbox:
 		return None
 
 	def collide_rectangle(self, h):
+		b = self.bounds()
+		if b is None or h.Mx < b[0] or h.My < b[1] or h.mx > b[2] or h.my > b[3]:
+			return None
+
 		for c in range(len(self.colliders)):
 			col = self.colliders[c].collide_rectangle(h)
 			if col is not None:
@@ -460,6 +683,11 @@ class Hitbox:
 	# Returns a pair of indeces for the first pair of colliders to hit.
 	# If there are no hits, return None, None
 	def collide_hitbox(self, h):
+		b = self.bounds()
+		hb = h.bounds()
+		if b is None or hb is None or hb[2] < b[0] or hb[3] < b[1] or hb[0] > b[2] or hb[1] > b[3]:
+			return None
+
 		for c_i in range(len(h.colliders)):
 			c = h.colliders[c_i]
 
@@ -474,3 +702,87 @@ class Hitbox:
 				return col
 
 		return None
+
+	# Transform-aware collision. These test this hitbox as if it was flipped along x when facing is -1 and then moved by offset,
+	# and the other collider or hitbox likewise, without copying either. Offsets of None don't move anything.
+	# The results match collide_<type>() and collide_hitbox() on transformed copies, except that Collisions reference the untransformed colliders.
+	# Callers are expected to have done their own broadphase, so there is no bounding box rejection.
+	# If fixed is True, every coordinate is integer fixed point. See push_out().
+	def collide_collider_at(self, facing, offset, c, c_facing=1, c_offset=None, fixed=False):
+		x, y = (0, 0) if offset is None else (offset.x, offset.y)
+		cx, cy = (0, 0) if c_offset is None else (c_offset.x, c_offset.y)
+
+		pc = c.placed(c_facing, cx, cy)
+		for s in self.colliders:
+			col = collide_placed(s, s.placed(facing, x, y), c, pc, fixed)
+			if col is not None:
+				return col
+		return None
+
+	def collide_hitbox_at(self, facing, offset, h, h_facing=1, h_offset=None, fixed=False):
+		x, y = (0, 0) if offset is None else (offset.x, offset.y)
+		hx, hy = (0, 0) if h_offset is None else (h_offset.x, h_offset.y)
+
+		ps = [s.placed(facing, x, y) for s in self.colliders]
+		for c in h.colliders:
+			pc = c.placed(h_facing, hx, hy)
+			for i in range(len(ps)):
+				col = collide_placed(self.colliders[i], ps[i], c, pc, fixed)
+				if col is not None:
+					return col
+		return None
+
+	# Same as collide_hitbox(), but tests all pairs of colliders at once with NumPy. Faster for large hitboxes.
+	# If all_contacts is True, returns a list of every collision rather than the first. See collision_np.py.
+	def collide_hitbox_batch(self, h, all_contacts=False):
+		from collision_np import collide_hitbox_batch
+		return collide_hitbox_batch(self, h, all_contacts)
+
+# -------- Broadphase --------
+
+# Uniform grid for finding objects near an area without testing all of them.
+# Objects are inserted with their bounding box and stored in every cell that box touches.
+# query() returns every object whose bounding box touches the passed one, in the order they were inserted.
+class SpatialHash:
+	def __init__(self, cell_size=256):
+		self.cell_size = cell_size
+
+		# Maps (cell x, cell y) to a list of indeces into items.
+		self.cells = {}
+
+		# Inserted objects and their bounding boxes as (left, top, right, bottom) tuples.
+		self.items = []
+		self.bounds = []
+
+	def __len__(self):
+		return len(self.items)
+
+	def insert(self, item, left, top, right, bottom):
+		i = len(self.items)
+		self.items.append(item)
+		self.bounds.append((left, top, right, bottom))
+
+		cs = self.cell_size
+		for cx in range(int(left // cs), int(right // cs) + 1):
+			for cy in range(int(top // cs), int(bottom // cs) + 1):
+				cell = self.cells.get((cx, cy))
+				if cell is None:
+					self.cells[(cx, cy)] = [i]
+				else:
+					cell.append(i)
+
+	def query(self, left, top, right, bottom):
+		cs = self.cell_size
+		found = set()
+		for cx in range(int(left // cs), int(right // cs) + 1):
+			for cy in range(int(top // cs), int(bottom // cs) + 1):
+				cell = self.cells.get((cx, cy))
+				if cell is not None:
+					found.update(cell)
+
+		ret = []
+		for i in sorted(found):
+			b = self.bounds[i]
+			if b[0] <= right and b[2] >= left and b[1] <= bottom and b[3] >= top:
+				ret.append(self.items[i])
+		return ret
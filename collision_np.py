@@ -0,0 +1,178 @@
+import numpy as np
+from collision import *
+
+# This library implements a NumPy collision engine for Hitboxes.
+# A Hitbox is split into a struct-of-arrays (one array each for its rectangles, circles, and points),
+# and every pair of colliders between two hitboxes is tested at once instead of in a doubly nested Python loop.
+# The results match the per-collider functions in collision.py.
+
+# -------- Vectorized Math --------
+
+# Vectorized min_axis(). np.argmin() picks the earliest minimum, matching min_axis() on ties.
+def _min_axis(dx1, dx2, dy1, dy2):
+	d = np.stack(np.broadcast_arrays(dx1, dx2, dy1, dy2))
+	k = np.argmin(d*d, axis=0)
+	v = np.take_along_axis(d, k[None], axis=0)[0]
+	return np.where(k < 2, v, 0.0), np.where(k < 2, 0.0, v)
+
+# Vectorized vec2.normalize(). Entries where (x, y) is the zero vector are garbage and must be masked by the caller.
+def _normalize(x, y, new_mag):
+	with np.errstate(divide="ignore", invalid="ignore"):
+		m = np.sqrt(x*x + y*y) / new_mag
+		zero = new_mag == 0
+		return np.where(zero, 0.0, x / m), np.where(zero, 0.0, y / m)
+
+# -------- Pairwise Tests --------
+# Each function tests every collider in a against every collider in b.
+# They return (hit, rx, ry), arrays of shape (len(a), len(b)) holding whether each pair hit and the resolution vectors.
+# Resolution vectors are only meaningful where hit is True.
+
+def _rect_rect(a, b):
+	amx, amy, aMx, aMy = (a[:, None, k] for k in range(4))
+	bmx, bmy, bMx, bMy = (b[None, :, k] for k in range(4))
+
+	hit = ~((aMx < bmx) | (aMy < bmy) | (amx > bMx) | (amy > bMy))
+	rx, ry = _min_axis(bmx - aMx, bMx - amx, bmy - aMy, bMy - amy)
+	return hit, rx, ry
+
+def _rect_circle(a, b):
+	amx, amy, aMx, aMy = (a[:, None, k] for k in range(4))
+	bx, by, br = (b[None, :, k] for k in range(3))
+
+	cdx = np.minimum(aMx, np.maximum(amx, bx)) - bx
+	cdy = np.minimum(aMy, np.maximum(amy, by)) - by
+	inside = (cdx == 0) & (cdy == 0)
+	sqr_d = cdx*cdx + cdy*cdy
+
+	ix, iy = _min_axis(bx - amx + br, bx - aMx - br, by - amy + br, by - aMy - br)
+	ox, oy = _normalize(cdx, cdy, br - np.sqrt(sqr_d))
+
+	hit = inside | (sqr_d <= br*br)
+	return hit, np.where(inside, ix, ox), np.where(inside, iy, oy)
+
+def _rect_point(a, b):
+	amx, amy, aMx, aMy = (a[:, None, k] for k in range(4))
+	bx, by = (b[None, :, k] for k in range(2))
+
+	hit = (bx >= amx) & (bx <= aMx) & (by >= amy) & (by <= aMy)
+	rx, ry = _min_axis(bx - amx, bx - aMx, by - amy, by - aMy)
+	return hit, rx, ry
+
+# Shared by circle-circle and circle-point tests. r is the distance at which the two touch.
+def _circle_common(cdx, cdy, r):
+	center = (cdx == 0) & (cdy == 0)
+	sqr_d = cdx*cdx + cdy*cdy
+	ox, oy = _normalize(cdx, cdy, r - np.sqrt(sqr_d))
+
+	hit = center | (sqr_d <= r*r)
+	rx = np.where(center, 0.0, ox)
+	ry = np.where(center, -r, oy)
+	return hit, rx, ry
+
+def _circle_circle(a, b):
+	return _circle_common(a[:, None, 0] - b[None, :, 0], a[:, None, 1] - b[None, :, 1], a[:, None, 2] + b[None, :, 2])
+
+def _circle_point(a, b):
+	cdx = a[:, None, 0] - b[None, :, 0]
+	cdy = a[:, None, 1] - b[None, :, 1]
+	return _circle_common(cdx, cdy, np.broadcast_to(a[:, None, 2], cdx.shape))
+
+def _point_point(a, b):
+	hit = (a[:, None, 0] == b[None, :, 0]) & (a[:, None, 1] == b[None, :, 1])
+	zero = np.zeros(hit.shape)
+	return hit, zero, zero
+
+# Wraps a test so that it runs with its arguments swapped, then un-swaps the result like Collision.swap() does.
+def _swapped(f):
+	def g(a, b):
+		hit, rx, ry = f(b, a)
+		return hit.T, -rx.T, -ry.T
+	return g
+
+# Test function for each (self type, other type) pair, indexed like HitboxArrays.groups().
+_tests = [
+	[_rect_rect,             _rect_circle,             _rect_point],
+	[_swapped(_rect_circle), _circle_circle,           _circle_point],
+	[_swapped(_rect_point),  _swapped(_circle_point),  _point_point],
+]
+
+# -------- Hitbox Arrays --------
+
+# Struct-of-arrays representation of a Hitbox.
+# rects is an (n, 4) array of (mx, my, Mx, My), circles is (n, 3) of (x, y, r), and points is (n, 2) of (x, y).
+# The matching *_i arrays hold the index in hb.colliders of each row.
+class HitboxArrays:
+	def __init__(self, hb):
+		self.colliders = list(hb.colliders)
+
+		rects, circles, points = [], [], []
+		rect_i, circle_i, point_i = [], [], []
+		for i, c in enumerate(self.colliders):
+			if type(c) == Rectangle:
+				rects.append((c.mx, c.my, c.Mx, c.My))
+				rect_i.append(i)
+			elif type(c) == Circle:
+				circles.append((c.x, c.y, c.r))
+				circle_i.append(i)
+			elif type(c) == Point:
+				points.append((c.x, c.y))
+				point_i.append(i)
+
+		self.rects = np.array(rects, dtype=float).reshape(-1, 4)
+		self.circles = np.array(circles, dtype=float).reshape(-1, 3)
+		self.points = np.array(points, dtype=float).reshape(-1, 2)
+
+		self.rect_i = np.array(rect_i, dtype=np.intp)
+		self.circle_i = np.array(circle_i, dtype=np.intp)
+		self.point_i = np.array(point_i, dtype=np.intp)
+
+	def __len__(self):
+		return len(self.colliders)
+
+	# Returns (array, indices) for rectangles, circles, and points, in that order.
+	def groups(self):
+		return [(self.rects, self.rect_i), (self.circles, self.circle_i), (self.points, self.point_i)]
+
+# Returns the index pairs and resolution vectors of every hit between a and b, ordered the way Hitbox.collide_hitbox() visits them.
+def _contacts(a, b):
+	ai, bi, rx, ry = [], [], [], []
+	for ta, (arr_a, idx_a) in enumerate(a.groups()):
+		if len(arr_a) == 0:
+			continue
+		for tb, (arr_b, idx_b) in enumerate(b.groups()):
+			if len(arr_b) == 0:
+				continue
+
+			hit, x, y = _tests[ta][tb](arr_a, arr_b)
+			i, j = np.nonzero(hit)
+			ai.append(idx_a[i])
+			bi.append(idx_b[j])
+			rx.append(x[i, j])
+			ry.append(y[i, j])
+
+	if len(ai) == 0:
+		return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0), np.zeros(0)
+
+	ai, bi, rx, ry = np.concatenate(ai), np.concatenate(bi), np.concatenate(rx), np.concatenate(ry)
+
+	# collide_hitbox() loops over the colliders of b on the outside and the colliders of a on the inside.
+	order = np.argsort(bi * len(a) + ai, kind="stable")
+	return ai[order], bi[order], rx[order], ry[order]
+
+# Tests every collider in a against every collider in b at once. a and b may be Hitboxes or HitboxArrays.
+# By default, returns the same Collision that a.collide_hitbox(b) would, or None.
+# If all_contacts is True, returns a list of Collisions for every pair of colliders that hit instead.
+def collide_hitbox_batch(a, b, all_contacts=False):
+	if type(a) != HitboxArrays:
+		a = HitboxArrays(a)
+	if type(b) != HitboxArrays:
+		b = HitboxArrays(b)
+
+	ai, bi, rx, ry = _contacts(a, b)
+
+	if not all_contacts:
+		if len(ai) == 0:
+			return None
+		return Collision(a.colliders[ai[0]], b.colliders[bi[0]], vec2(float(rx[0]), float(ry[0])))
+
+	return [Collision(a.colliders[i], b.colliders[j], vec2(x, y)) for i, j, x, y in zip(ai.tolist(), bi.tolist(), rx.tolist(), ry.tolist())]
@@ -1,11 +1,57 @@
+import math
+import zlib
+import functools
+import collections
+import array
+import bisect
 import pygame as pg
+import fonts
+import profiler
 from collision import *
 
 # Super handy functions for drawing rects with names in lieu of images.
+# The font is loaded once, and labels are cached, so drawing the same labels every frame costs only the blits.
+# Both are dropped when pygame quits (see fonts.py).
+
+# Returns the font used for labels.
+def debug_font():
+	return fonts.sysfont(["couriernew", "ubuntumono"], 11)
+
+# Returns the (width, height) of text in the debug font.
+@functools.lru_cache(maxsize=4096)
+def debug_text_size(text):
+	return debug_font().size(text)
+
+# Returns the longest start of text that is at most max_width wide.
+# Text only grows as characters are added, so this binary searches on the length.
+@functools.lru_cache(maxsize=4096)
+def debug_fit_text(text, max_width):
+	lo = 0
+	hi = len(text)
+	while lo < hi:
+		mid = (lo + hi + 1) // 2
+		if debug_text_size(text[:mid])[0] <= max_width:
+			lo = mid
+		else:
+			hi = mid - 1
+	return text[:lo]
+
+# Returns the rendered surface for a label, rotated to read downward if vertical is True.
+@functools.lru_cache(maxsize=512)
+def debug_label(text, color, vertical):
+	text_surface = debug_font().render(text, False, color)
+	if vertical:
+		text_surface = pg.transform.rotate(text_surface, -90)
+	return text_surface
+
+@fonts.on_quit
+def clear_debug_caches():
+	debug_text_size.cache_clear()
+	debug_fit_text.cache_clear()
+	debug_label.cache_clear()
+
 def debug_rect(surf, color, rect, name=""):
 	pg.draw.rect(surf, color, rect, width=1)
-	
-	dbg_fnt = pg.font.SysFont(["couriernew", "ubuntumono"], 11)
 
 	# Code to draw the name
 	if name != "":
@@ -18,31 +64,33 @@ def debug_rect(surf, color, rect, name=""):
 			max_text_width = rect.h - 2
 			max_text_height = rect.w - 2
 		
-		if dbg_fnt.size(name)[1] > max_text_height:
+		if debug_text_size(name)[1] > max_text_height:
 			# Not enough vertical space to render text.
 			return
 		
-		# Should probably implement a faster algorithm for
-		# Trimming down strings that don't fit in the rect
-		while dbg_fnt.size(name)[0] > max_text_width:
-			name = name[:-1]
-		
-		# Render text
-		text_surface = dbg_fnt.render(name, False, color)
-		
-		# Rotate if necessary
-		if rect.h > rect.w + 2:
-			text_surface = pg.transform.rotate(text_surface, -90)
+		# Trim the name down to fit in the rect
+		name = debug_fit_text(name, max_text_width)
+		if name == "":
+			return
 		
 		# Blit text into the rect.
-		surf.blit(text_surface, (rect.left+2, rect.top+2))
+		surf.blit(debug_label(name, tuple(color), rect.h > rect.w + 2), (rect.left+2, rect.top+2))
 
+# Animation of a collider and the damage it does over the frames of an attack.
+# Colliders and damage are linearly interpolated between the frames they are added at.
+# Call compile() once all colliders are added to make lookups on integer frames O(1).
 class collider_anim:
 	def __init__(self):
 		self.frame_markers = []
 		self.cols = []
 		self.damage = []
 		self.anim_type = None
+
+		# Lookup tables built by compile(), indexed by frame - table_start. None if not compiled.
+		self.table_start = 0
+		self.col_table = None
+		self.col_table_m = None
+		self.dmg_table = None
 	
 	def add_col(self, col, dmg, frame):
 		if self.anim_type == None:
@@ -54,35 +102,100 @@ class collider_anim:
 		self.frame_markers.append(frame)
 		self.damage.append(dmg)
 		self.cols.append(col)
-	
-	def get_col(self, t):
+
+		# Adding a collider invalidates the tables.
+		self.col_table = None
+		self.col_table_m = None
+		self.dmg_table = None
+
+	# Bakes the collider and damage for every integer frame into tables.
+	# If mirror is True, colliders flipped along x (for fighters facing -1) are baked as well.
+	# If fixed is True, the interpolated coordinates and damage are rounded to integers, for use in deterministic fights.
+	def compile(self, mirror=True, fixed=False):
+		start = math.ceil(self.frame_markers[0])
+		frames = range(start, math.floor(self.frame_markers[-1]) + 1)
+
+		self.table_start = start
+		self.col_table = [self.interpolate_col(t) for t in frames]
+		self.dmg_table = [self.interpolate_dmg(t) for t in frames]
+		if fixed:
+			self.col_table = [c.scaled(1) for c in self.col_table]
+			self.dmg_table = [round(d) for d in self.dmg_table]
+
+		self.col_table_m = None
+		if mirror:
+			self.col_table_m = []
+			for c in self.col_table:
+				c = c.copy()
+				c.flip_x()
+				self.col_table_m.append(c)
+
+	# Returns the collider at frame t, flipped along x if facing is -1, or None if t is outside of the animation.
+	# The returned collider may be shared and must not be modified.
+	def get_col(self, t, facing=1):
+		if self.col_table is not None and type(t) == int:
+			i = t - self.table_start
+			if i < 0 or i >= len(self.col_table):
+				return None
+			if facing == 1:
+				return self.col_table[i]
+			if self.col_table_m is not None:
+				return self.col_table_m[i]
+
+		c = self.interpolate_col(t)
+		if c is not None and facing == -1:
+			c = c.copy()
+			c.flip_x()
+		return c
+
+	# Returns the damage at frame t, or 0 if t is outside of the animation.
+	def get_dmg(self, t):
+		if self.dmg_table is not None and type(t) == int:
+			i = t - self.table_start
+			if i < 0 or i >= len(self.dmg_table):
+				return 0
+			return self.dmg_table[i]
+		return self.interpolate_dmg(t)
+
+	# Returns the index of the last frame marker at or before t, excluding the final marker. t must be inside the animation.
+	def find_marker(self, t):
+		return min(bisect.bisect_right(self.frame_markers, t), len(self.frame_markers) - 1) - 1
+
+	# Returns a compiled copy of this animation for deterministic fights, with every collider scaled by one and rounded.
+	def fixed(self, one):
+		a = collider_anim()
+		for i in range(len(self.cols)):
+			a.add_col(self.cols[i].scaled(one), self.damage[i], self.frame_markers[i])
+		a.compile(fixed=True)
+		return a
+
+	# Computes the collider at frame t without the tables.
+	def interpolate_col(self, t):
 		if t < self.frame_markers[0] or t > self.frame_markers[-1]:
 			return None
 		if t == self.frame_markers[-1]:
 			return self.cols[-1]
 
-		for i in range(len(self.frame_markers)-2, -1, -1):
-			if self.frame_markers[i] <= t:
-				t_val = (t - self.frame_markers[i]) / (self.frame_markers[i+1] - self.frame_markers[i])
-				return self.anim_type.lerp(self.cols[i], self.cols[i+1], t_val)
+		i = self.find_marker(t)
+		t_val = (t - self.frame_markers[i]) / (self.frame_markers[i+1] - self.frame_markers[i])
+		return self.anim_type.lerp(self.cols[i], self.cols[i+1], t_val)
 
-	def get_dmg(self, t):
-		print(self.damage, t)
+	# Computes the damage at frame t without the tables.
+	def interpolate_dmg(self, t):
 		if t < self.frame_markers[0] or t > self.frame_markers[-1]:
 			return 0
 		if t == self.frame_markers[-1]:
 			return self.damage[-1]
 		
-		for i in range(len(self.frame_markers)-2, -1, -1):
-			if self.frame_markers[i] <= t:
-				t_val = (t - self.frame_markers[i]) / (self.frame_markers[i+1] - self.frame_markers[i])
-				return lerp(self.damage[i], self.damage[i+1], t_val)
+		i = self.find_marker(t)
+		t_val = (t - self.frame_markers[i]) / (self.frame_markers[i+1] - self.frame_markers[i])
+		return lerp(self.damage[i], self.damage[i+1], t_val)
 
 # Class for storing an attack
+# Attacks are definitions shared by every fighter that uses them. Each fighter tracks its own progress through its attack.
 class attack:
 	def __init__(self, n):
 		self.frames = n
-		self.frame = 0
 
 		# List of collider_anim instances.
 		self.anim = []
@@ -90,6 +203,11 @@ class attack:
 	def add_anim(self, a):
 		self.anim.append(a)
 
+	# Compiles every collider_anim of this attack. See collider_anim.compile().
+	def compile(self, mirror=True):
+		for a in self.anim:
+			a.compile(mirror)
+
 # Class for holding a platform.
 class platform(pg.sprite.Sprite):
 	def __init__(self, rect, surf=None):
@@ -136,6 +254,9 @@ class stance:
 		self.deg = deg
 		self.deg_t = deg_t
 
+		# Index used by event(), built on demand by build_index(). Maps each trigger to (bounds, at, between).
+		self.index = None
+
 	# Returns True if this stance should degrade or False otherwise
 	def is_degraded(self, t):
 		return self.deg_t is not None and t > self.deg_t
@@ -143,14 +264,54 @@ class stance:
 	# Create a connection and add it to this stance
 	def add_connection(self, dest, trigger, transition_time=0, time_in=0, time_out=None, atk=None):
 		self.connections.append(connection(self, dest, trigger, transition_time, time_in, time_out, atk))
-	
-	# Returns the valid connection that should be followed in response to this event, if it exists. Return None otherwise.
-	def event(self, trigger, t):
+		self.index = None
+
+	# Returns the first connection in connections with the passed trigger that is valid at time t, or None.
+	def first_valid(self, trigger, t):
 		for c in self.connections:
 			if trigger == c.trigger and c.is_valid(t):
 				return c
 		return None
 
+	# Builds the index used by event().
+	# For each trigger, the time-ins and time-outs of its connections split time into segments where the same connections are valid.
+	# bounds is the sorted list of those times, at[i] is the connection to follow when t equals bounds[i],
+	# and between[i] is the connection to follow when t is between bounds[i-1] and bounds[i] (or outside all of them, for the first and last).
+	def build_index(self):
+		self.index = {}
+		for trigger in set(c.trigger for c in self.connections):
+			bounds = set()
+			for c in self.connections:
+				if c.trigger == trigger:
+					bounds.add(c.ti)
+					if c.to is not None:
+						bounds.add(c.to)
+			bounds = sorted(bounds)
+
+			at = [self.first_valid(trigger, b) for b in bounds]
+			between = [self.first_valid(trigger, bounds[0] - 1)]
+			for i in range(1, len(bounds)):
+				between.append(self.first_valid(trigger, (bounds[i-1] + bounds[i]) / 2))
+			between.append(self.first_valid(trigger, bounds[-1] + 1))
+
+			self.index[trigger] = (bounds, at, between)
+	
+	# Returns the valid connection that should be followed in response to this event, if it exists. Return None otherwise.
+	# This is the first valid connection with that trigger, found by binary search in the index.
+	def event(self, trigger, t):
+		if self.index is None:
+			self.build_index()
+
+		ind = self.index.get(trigger)
+		if ind is None:
+			return None
+
+		bounds, at, between = ind
+		i = bisect.bisect_left(bounds, t)
+		if i < len(bounds) and bounds[i] == t:
+			return at[i]
+		return between[i]
+
 # Class for holding a fighter.
 class fighter(pg.sprite.Sprite):
 	JUMP = 0
@@ -175,12 +336,13 @@ class fighter(pg.sprite.Sprite):
 
 		self.health = 100
 
-		# List of currently ongoing attacks
+		# The ongoing attack, and the frame of it this fighter is on
 		self.atk = None
+		self.atk_frame = 0
 		
 		# List of attacks which have already damaged this fighter
 		self.immunities = []
-		self.immunity_t = []
+		self.immunities_t = []
 
 		# The fight instance thaat this fighter belongs to,
 		self.f = fight
@@ -195,11 +357,17 @@ class fighter(pg.sprite.Sprite):
 		# Position and velocity
 		self.pos = vec2(0, 0)
 		self.vel = vec2(0, 0)
+
+		# Position before the last fight.update(), which rendering can interpolate from. See blended_pos().
+		self.prev_pos = vec2(0, 0)
 		self.facing = 1
 
 		# Array of control states
 		self.controls = [0, 0, 0, 0, 0]
 
+		# Index of this fighter in fight.fighters. Set by fight.add_fighter().
+		self.index = 0
+
 	# Call this function to send controls to the fighter
 	def set_control(self, con, val):
 		if not val:
@@ -207,6 +375,11 @@ class fighter(pg.sprite.Sprite):
 		else:
 			if self.controls[con] == 0:
 				self.controls[con] = 1
+
+	# Sets every control at once from a sequence of truthy values indexed like the control constants.
+	def set_controls(self, vals):
+		for i in range(len(vals)):
+			self.set_control(i, vals[i])
 	
 	# Position/Velocity manipulation
 	def set_position(self, pos):
@@ -226,16 +399,61 @@ class fighter(pg.sprite.Sprite):
 		self.vel.y += d_vel[1]
 	
 	def step(self, dt):
-		self.pos.x += self.vel[0] * dt
-		self.pos.y += self.vel[1] * dt
+		self.pos.x += self.vel.x * dt
+		self.pos.y += self.vel.y * dt
+
+	# Fixed point version of step(), for a time step of 1/rate, which rounds toward negative infinity.
+	def step_fixed(self, rate):
+		self.pos.x += self.vel.x // rate
+		self.pos.y += self.vel.y // rate
 
 	def attack(self, atk):
 		self.atk = atk
-		self.atk.frame = 0
+		self.atk_frame = 0
+
+	# Returns the (left, right) extent in world coordinates of the current frame of this fighter's attack, or None if nothing can hit.
+	def attack_extent(self):
+		if self.atk is None:
+			return None
+
+		ext = None
+		for anm in self.atk.anim:
+			col = anm.get_col(self.atk_frame)
+			if col is None:
+				continue
+
+			l, t, r, b = col.bounds_at(self.facing, self.pos.x, self.pos.y)
+			if ext is None:
+				ext = (l, r)
+			else:
+				ext = (min(ext[0], l), max(ext[1], r))
+		return ext
+
+	# Returns the (left, right) extent in world coordinates of this fighter's hitbox, or None if it has no colliders.
+	def body_extent(self):
+		b = self.stance.hb.bounds_at(self.facing, self.pos.x, self.pos.y)
+		if b is None:
+			return None
+		return b[0], b[2]
+
+	# Returns the damage the current frame of this fighter's attack does to fighter b, which is 0 if it misses.
+	def attack_damage(self, b):
+		dmg = 0
+		for anm in self.atk.anim:
+			# Collide the collider from the current frame of the animation "anm" from attack "atk" from this fighter with the hitbox from fighter "b"
+			# Both are tested in place, as if flipped to face the way their fighter does and moved to its position.
+			col1 = anm.get_col(self.atk_frame)
+			if col1 is None:
+				continue
+
+			collision = b.stance.hb.collide_collider_at(b.facing, b.pos, col1, self.facing, self.pos, self.f.deterministic)
+			if collision is not None:
+				dmg = max(dmg, anm.get_dmg(self.atk_frame))
+		return dmg
 
 	def add_immunity(self, f):
 		self.immunities.append(f)
-		self.immunities_t.append(f.atk.frames - f.atk.frame + 1)
+		self.immunities_t.append(f.atk.frames - f.atk_frame + 1)
 	
 	def update_immunity(self):
 		n_immunities = []
@@ -252,47 +470,118 @@ class fighter(pg.sprite.Sprite):
 		self.immunities = n_immunities
 		self.immunities_t = n_immunities_t
 
+	# Appends the state of this fighter to the list data. Stances and attacks are stored as ids from fight.object_id().
+	# Used by fight.snapshot().
+	def save_state(self, data):
+		data += (
+			self.pos.x, self.pos.y, self.vel.x, self.vel.y,
+			self.f.object_id(self.stance), self.stance_t, self.t_wait,
+			-1 if self.atk is None else self.f.object_id(self.atk), self.atk_frame,
+			self.health, self.grounded, self.standing, self.facing
+		)
+		data += self.controls
+
+		data.append(len(self.immunities))
+		for i in range(len(self.immunities)):
+			data.append(self.immunities[i].index)
+			data.append(self.immunities_t[i])
+
+	# Loads the state of this fighter from data, starting at index i, and returns the index after it.
+	# Used by fight.restore().
+	def load_state(self, data, i):
+		self.pos.x, self.pos.y, self.vel.x, self.vel.y = data[i:i+4]
+		self.stance = self.f.objects[int(data[i+4])]
+		self.stance_t = int(data[i+5])
+		self.t_wait = int(data[i+6])
+
+		a = int(data[i+7])
+		self.atk = None if a == -1 else self.f.objects[a]
+		self.atk_frame = int(data[i+8])
+
+		# Health starts as an int, and only interpolated damage in float fights can make it fractional.
+		self.health = data[i+9]
+		if self.health.is_integer():
+			self.health = int(self.health)
+		if self.f.deterministic:
+			self.pos.x, self.pos.y, self.vel.x, self.vel.y = int(self.pos.x), int(self.pos.y), int(self.vel.x), int(self.vel.y)
+		self.grounded = bool(data[i+10])
+		self.standing = bool(data[i+11])
+		self.facing = int(data[i+12])
+		self.controls = [int(c) for c in data[i+13:i+18]]
+		i += 18
+
+		# Nothing is interpolated across a restore.
+		self.prev_pos.x = self.pos.x
+		self.prev_pos.y = self.pos.y
+
+		n = int(data[i])
+		self.immunities = [self.f.fighters[int(f)] for f in data[i+1:i+1+2*n:2]]
+		self.immunities_t = [int(t) for t in data[i+2:i+2+2*n:2]]
+		return i + 1 + 2*n
+
+	# Returns the (x, y) position to draw this fighter at, blend of the way from its position before the last fight.update() to its current one.
+	def blended_pos(self, blend):
+		if blend == 1:
+			return self.pos.x, self.pos.y
+		return self.prev_pos.x + (self.pos.x - self.prev_pos.x) * blend, self.prev_pos.y + (self.pos.y - self.prev_pos.y) * blend
+
 	# Handles update per-frame.
 	def update(self):
+		prof = profiler.current
+		if prof is not None:
+			t = profiler.clock()
+
 		self.standing = not self.controls[fighter.DOWN]
 		
 		self.update_immunity()
+		if prof is not None:
+			t = prof.lap("fighter.immunity", t)
 
-		hb = self.stance.hb.copy()
+		# Distances are in units of 1/one, which is 1 unless the fight is deterministic.
+		one = self.f.one
 
 		if self.grounded and self.controls[fighter.JUMP]:
-			self.accelerate((0, -800))
+			self.accelerate((0, -800 * one))
 
-		self.accelerate((0, 50))
+		self.accelerate((0, 50 * one))
 
 		if self.controls[fighter.LEFT]:
-			self.move((-5, 0))
+			self.move((-5 * one, 0))
 			self.facing = -1
 
 		if self.controls[fighter.RIGHT]:
-			self.move((5, 0))
+			self.move((5 * one, 0))
 			self.facing = 1
 
-		self.step(1/30)
-
-		hb.move(self.pos)
+		if self.f.deterministic:
+			self.step_fixed(30)
+		else:
+			self.step(1/30)
+		if prof is not None:
+			t = prof.lap("fighter.movement", t)
 
 		# Collision Testing and resolution
+		# The stance's hitbox is tested in place at the position the fighter had before any collisions were resolved.
 		# Sets grounded to true if a collision is detected whose resolution requires going up.
+		hb = self.stance.hb
+		pos = self.pos.copy()
+
 		self.grounded = False
-		for p in self.f.platforms:
-			col = hb.collide_hitbox(p.collider)
+		for p in self.f.platforms_near(hb.bounds_at(1, pos.x, pos.y)):
+			col = hb.collide_hitbox_at(1, pos, p.collider, fixed=self.f.deterministic)
 		
 			if col is not None:
 				if col.r.x != 0:
-					self.vel[0] = 0
+					self.vel.x = 0
 
 				if col.r.y != 0:
-					self.vel[1] = 0
+					self.vel.y = 0
 					if col.r.y < 0:
 						self.grounded = True
 
 				self.move(col.r)
+		if prof is not None:
+			t = prof.lap("fighter.platforms", t)
 
 		# Test for stance transitions
 		if self.t_wait > 0:
@@ -315,10 +604,10 @@ class fighter(pg.sprite.Sprite):
 
 		# Update attack
 		if self.atk != None:
-			if self.atk.frame >= self.atk.frames:
+			if self.atk_frame >= self.atk.frames:
 				self.atk = None
 			else:
-				self.atk.frame += 1
+				self.atk_frame += 1
 
 		# Update control list so that 1s beome 2s (Indicating that those controls are being held)
 		for i in range(len(self.controls)):
@@ -327,70 +616,407 @@ class fighter(pg.sprite.Sprite):
 
 		# Increment the stance timer
 		self.stance_t += 1
+		if prof is not None:
+			prof.lap("fighter.stances", t)
+
+# Number of fixed point units in one world unit in deterministic fights.
+FIXED_ONE = 256
 
 # Class for holding a fighting scene. One is instantiated whenever a fight begins. 
+# cell_size is the size in world units of the cells of the broadphase grid used to find platforms near fighters.
+# If deterministic is True, the fight runs entirely on integers, so that every machine computes exactly the same frames from the same inputs.
+# Positions, velocities and colliders are then in fixed point, with FIXED_ONE units per world unit, and fighters are given copies of their
+# move sets converted to fixed point (see fixed()). Platforms are converted as they are added. Rendering converts back to world units.
 class fight:
-	def __init__(self):
+	def __init__(self, cell_size=256, deterministic=False):
 		self.platforms = []
 		self.fighters = []
+
+		self.deterministic = deterministic
+		self.one = FIXED_ONE if deterministic else 1
+
+		# Broadphase for platforms. Platforms must be added with add_platform() to be collided with.
+		self.platform_grid = SpatialHash(cell_size * self.one)
+
+		# Number of times update() has been called.
+		self.frame = 0
+
+		# Hits landed during the last update(), as (attacker, defender, damage).
+		self.hits = []
+
+		# Stances and attacks that have been given ids by object_id(), so that snapshots can refer to them by number.
+		self.objects = []
+		self.object_ids = {}
+
+		# Fixed point copies of stances, attacks and animations made by fixed(), keyed by the original.
+		self.fixed_objects = {}
 	
 	# Add a platform and return its handle.
 	def add_platform(self, rect, surf=None):
-		self.platforms.append(platform(rect, surf))
-		return self.platforms[-1]
+		p = platform(rect, surf)
+		if self.deterministic:
+			p.collider = p.collider.scaled(self.one)
+		self.platforms.append(p)
+		self.platform_grid.insert(p, *p.collider.bounds())
+		return p
+
+	# Returns the platforms whose bounds touch the passed (left, top, right, bottom) bounds. Bounds of None touch nothing.
+	def platforms_near(self, b):
+		if b is None:
+			return []
+		return self.platform_grid.query(b[0], b[1], b[2], b[3])
 	
 	# Add a fighter and return the new sprite.
+	# In deterministic fights, the fighter starts in the fixed point copy of the passed stance.
 	def add_fighter(self, rect, hb, team, surf=None):
-		self.fighters.append(fighter(rect, surf, self, hb, team))
-		return self.fighters[-1]
+		if self.deterministic:
+			hb = self.fixed(hb)
+		f = fighter(rect, surf, self, hb, team)
+		f.index = len(self.fighters)
+		self.fighters.append(f)
+		self.register_stances(hb)
+		return f
+
+	# Gives ids to every stance and attack reachable from the passed stance, in the order they are reached.
+	# This makes ids depend only on how the fight was built, so snapshots can be restored into any fight built the same way.
+	def register_stances(self, s):
+		todo = [s]
+		while len(todo) > 0:
+			s = todo.pop()
+			if s in self.object_ids:
+				continue
+			self.object_id(s)
+
+			for conn in s.connections:
+				if conn.atk is not None:
+					self.object_id(conn.atk)
+			for conn in reversed(s.connections):
+				todo.append(conn.dest)
+			if s.deg is not None:
+				todo.append(s.deg)
+
+	# Returns the id of a shared object (a stance or attack), assigning it a new one if it has none.
+	def object_id(self, o):
+		i = self.object_ids.get(o)
+		if i is None:
+			i = len(self.objects)
+			self.objects.append(o)
+			self.object_ids[o] = i
+		return i
+
+	# Returns the fixed point copy of a stance, attack or collider_anim for this fight, converting it and everything it links to the first time.
+	def fixed(self, o):
+		c = self.fixed_objects.get(o)
+		if c is not None:
+			return c
+
+		if type(o) == collider_anim:
+			c = o.fixed(self.one)
+			self.fixed_objects[o] = c
+		elif type(o) == attack:
+			c = attack(o.frames)
+			self.fixed_objects[o] = c
+			for a in o.anim:
+				c.add_anim(self.fixed(a))
+		else:
+			# The copy is registered before following connections, which may loop back to it.
+			c = stance(o.hb.scaled(self.one), None, o.deg_t)
+			self.fixed_objects[o] = c
+			if o.deg is not None:
+				c.deg = self.fixed(o.deg)
+			for conn in o.connections:
+				atk = None if conn.atk is None else self.fixed(conn.atk)
+				c.add_connection(self.fixed(conn.dest), conn.trigger, conn.t_time, conn.ti, conn.to, atk)
+		return c
+
+	# Returns the complete state of the simulation as a flat array of doubles. Pass it to restore() to return to this frame.
+	# Move sets, platforms and other definitions are not included, so a snapshot can only be restored into the fight that took it or one built the same way.
+	def snapshot(self):
+		data = [self.frame, len(self.fighters)]
+		for f in self.fighters:
+			f.save_state(data)
+		return array.array("d", data)
+
+	# Restores the state saved by snapshot().
+	def restore(self, snap):
+		if int(snap[1]) != len(self.fighters):
+			raise ValueError("Snapshot has %d fighters, but this fight has %d." % (int(snap[1]), len(self.fighters)))
+
+		self.frame = int(snap[0])
+		i = 2
+		for f in self.fighters:
+			i = f.load_state(snap, i)
 	
+	# Returns a CRC-32 of the state of the simulation. Peers running the same deterministic fight get the same checksum on the same frame,
+	# so exchanging checksums detects a desync on the frame it happens.
+	def checksum(self):
+		return zlib.crc32(self.snapshot())
+
+	# Broadphase for attacks. Returns the sorted (attacker index, defender index) pairs of fighters on different teams
+	# where the attacker's current attack overlaps the defender's hitbox along x.
+	# This sweeps over both sets of extents sorted by their left edge, so only overlapping pairs are ever compared.
+	def attack_pairs(self):
+		# Each entry is (left, right, is_attack, fighter index)
+		ext = []
+		for i, f in enumerate(self.fighters):
+			a = f.attack_extent()
+			if a is not None:
+				ext.append((a[0], a[1], True, i))
+
+			b = f.body_extent()
+			if b is not None:
+				ext.append((b[0], b[1], False, i))
+		ext.sort(key=lambda e: e[0])
+
+		pairs = []
+		active_atk = []
+		active_body = []
+		for e in ext:
+			# Drop extents which end before this one starts. Touching extents still overlap.
+			active_atk = [o for o in active_atk if o[1] >= e[0]]
+			active_body = [o for o in active_body if o[1] >= e[0]]
+
+			if e[2]:
+				for o in active_body:
+					if self.fighters[o[3]].team != self.fighters[e[3]].team:
+						pairs.append((e[3], o[3]))
+				active_atk.append(e)
+			else:
+				for o in active_atk:
+					if self.fighters[o[3]].team != self.fighters[e[3]].team:
+						pairs.append((o[3], e[3]))
+				active_body.append(e)
+
+		pairs.sort()
+		return pairs
+
+	# Returns a list of (attacker, defender, damage) for every attack that lands this frame.
+	# Hits are listed in the same order as looping over every attacker and then every defender.
+	def attack_hits(self):
+		hits = []
+		for i, j in self.attack_pairs():
+			a = self.fighters[i]
+			b = self.fighters[j]
+
+			# Test that b is not immune to a
+			if a in b.immunities:
+				continue
+
+			dmg = a.attack_damage(b)
+			if dmg > 0:
+				hits.append((a, b, dmg))
+		return hits
+
 	# Update the scene by calling update() on all sprites.
 	def update(self):
+		prof = profiler.current
+		if prof is not None:
+			t = profiler.clock()
+
+		for f in self.fighters:
+			f.prev_pos.x = f.pos.x
+			f.prev_pos.y = f.pos.y
+
 		# Do attack collision tests.
-		for a in self.fighters:
-			for b in self.fighters:
-				# Test that the fighters are on different teams, that b is not immune to a, and that a is attacking
-				if b.team == a.team or a in b.immunities or a.atk == None:
-					continue
-
-				dmg = 0
-				for anm in a.atk.anim:
-					# Collide the collider from the current frame of the animation "anm" from attack "atk" from fighter "a" with the hitbox from fighter "b"
-					col1 = anm.get_col(a.atk.frame)
-					if col1 is None:
-						continue
-
-					col1 = col1.copy()
-					if a.facing == -1:
-						col1.flip_x()
-					col1.move(a.pos)
-
-					col2 = b.stance.hb.copy()
-					if b.facing == -1:
-						col2.flip_x()
-					col2.move(b.pos)
-
-					collision = col1.collide_hitbox(col2)
-					if collision is not None:
-						dmg = max(dmg, anm.get_dmg(a.atk.frame))
-
-				if dmg > 0:
-					b.health -= dmg
-					b.add_immunity(a)
+		self.hits = self.attack_hits()
+		for a, b, dmg in self.hits:
+			b.health -= dmg
+			b.add_immunity(a)
+		if prof is not None:
+			t = prof.lap("fight.attacks", t)
 
 		for p in self.platforms:
 			p.update()
 		for f in self.fighters:
 			f.update()
+		if prof is not None:
+			prof.lap("fight.fighters", t)
+
+		self.frame += 1
+
+	# Runs the fight for n_frames frames as fast as possible. Nothing here renders, so it needs neither a display nor pg.init().
+	# inputs gives the controls to apply before each frame, as a list with a sequence of control values for each fighter (see fighter.set_controls()).
+	# It can be a sequence with one entry per frame, or a function which is passed this fight before each frame and returns that frame's entry.
+	# Entries of None leave all controls as they were. So does passing no inputs at all.
+	def simulate(self, n_frames, inputs=None):
+		for i in range(n_frames):
+			if inputs is None:
+				frame_inputs = None
+			elif callable(inputs):
+				frame_inputs = inputs(self)
+			else:
+				frame_inputs = inputs[i]
+
+			if frame_inputs is not None:
+				for f, vals in zip(self.fighters, frame_inputs):
+					f.set_controls(vals)
+
+			self.update()
+
+# Rounds a size in pixels up to the nearest size with at most 6 significant bits, which is within 1/32 above it. Sizes below 64 are kept exactly.
+def quantize_size(n):
+	shift = max(0, n.bit_length() - 6)
+	return -(-n >> shift) << shift
+
+# Cache of scaled copies of images, so that images are only rescaled when the zoom changes noticeably.
+# Copies are made at the size asked for rounded up by quantize_size(), so small zoom changes reuse the same copies,
+# and are cut down to exactly the size asked for, so images always cover the same area as their platforms.
+# Copies are evicted least recently used first once they take more than max_bytes.
+# Images are cached by identity, so call clear() after drawing on one that has already been rendered.
+class scale_cache:
+	def __init__(self, max_bytes=64*1024*1024):
+		self.max_bytes = max_bytes
+		self.bytes = 0
+
+		# Maps (image, width, height) to its scaled copy, least recently used first.
+		self.surfaces = collections.OrderedDict()
+
+	# Returns a surface of size (w, h) showing img scaled to about that size, with anything past it cut off.
+	def get(self, img, w, h):
+		key = (img, quantize_size(w), quantize_size(h))
+		scaled = self.surfaces.get(key)
+		if scaled is not None:
+			self.surfaces.move_to_end(key)
+		else:
+			scaled = pg.transform.scale(img, key[1:])
+			self.surfaces[key] = scaled
+			self.bytes += self.size(scaled)
+			while self.bytes > self.max_bytes and len(self.surfaces) > 1:
+				k, old = self.surfaces.popitem(last=False)
+				self.bytes -= self.size(old)
+
+		if scaled.get_size() == (w, h):
+			return scaled
+		return scaled.subsurface((0, 0, w, h))
+
+	def size(self, surf):
+		return surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+	def clear(self):
+		self.surfaces.clear()
+		self.bytes = 0
+
+# Returns a screen rect around everything camera.draw_fighter() draws from rects, as returned by camera.fighter_rects().
+def fighter_bounds(rects):
+	ret = pg.Rect(rects[0][0], rects[0][1], rects[0][2] + 1, rects[0][3] + 1)
+	for r in rects[1:]:
+		if len(r) == 2:
+			# The pos marker, a circle of radius 2.
+			ret.union_ip(pg.Rect(r[0] - 3, r[1] - 3, 7, 7))
+		else:
+			ret.union_ip(pg.Rect(r[0], r[1], r[2] + 1, r[3] + 1))
+	return ret.inflate(2, 2)
+
+# Draws platform p onto surf with its top left corner at (x, y), scaled by (scale_x, scale_y). Images are scaled through the scale_cache scaled.
+def draw_platform(surf, p, x, y, scale_x, scale_y, scaled):
+	img_w = p.rect.width * scale_x
+	img_h = p.rect.height * scale_y
+
+	if p.image == None:
+		debug_rect(surf, (40, 40, 200), pg.Rect(x, y, img_w, img_h), "Platform")
+	else:
+		surf.blit(scaled.get(p.image, int(img_w), int(img_h)), (x, y))
+
+# The platforms of a fight drawn ahead of time at one scale over an opaque background, so that they can be drawn with a few opaque blits
+# instead of at least one blit per platform.
+# World space is split into square tiles of tile_size pixels at that scale. Tiles are drawn the first time they are needed,
+# and up to max_tiles of them are kept, least recently used first. Platforms never move, so tiles never need redrawing at the same scale.
+# Coordinates on the layer are world coordinates multiplied by the scale.
+class stage_layer:
+	def __init__(self, f, scale_x, scale_y, scaled, background=(0, 0, 0), tile_size=512, max_tiles=64):
+		self.f = f
+		self.n_platforms = len(f.platforms)
+		self.scale_x = scale_x
+		self.scale_y = scale_y
+		self.scaled = scaled
+		self.background = background
+		self.tile_size = tile_size
+		self.max_tiles = max_tiles
+
+		# Maps (tile x, tile y) to its surface, or None if no platform touches it, least recently used first.
+		self.tiles = collections.OrderedDict()
+
+	# Whether the layer still shows every platform of f at about (scale_x, scale_y), within a fraction threshold of either.
+	def fits(self, f, scale_x, scale_y, threshold):
+		return f is self.f and len(f.platforms) == self.n_platforms and \
+			abs(scale_x / self.scale_x - 1) <= threshold and abs(scale_y / self.scale_y - 1) <= threshold
+
+	def tile(self, tx, ty):
+		if (tx, ty) in self.tiles:
+			self.tiles.move_to_end((tx, ty))
+			return self.tiles[(tx, ty)]
+
+		# Platforms are looked up with a pixel of margin, since their rects are truncated when drawn.
+		ts = self.tile_size
+		one = self.f.one
+		left   = (tx*ts - 1) / self.scale_x * one
+		top    = (ty*ts - 1) / self.scale_y * one
+		right  = ((tx+1)*ts + 1) / self.scale_x * one
+		bottom = ((ty+1)*ts + 1) / self.scale_y * one
+		platforms = self.f.platforms_near((left, top, right, bottom))
+
+		surf = None
+		if len(platforms) > 0:
+			surf = pg.Surface((ts, ts))
+			surf.fill(self.background)
+			for p in platforms:
+				draw_platform(surf, p, p.rect.left * self.scale_x - tx*ts, p.rect.top * self.scale_y - ty*ts, self.scale_x, self.scale_y, self.scaled)
+
+		self.tiles[(tx, ty)] = surf
+		if len(self.tiles) > self.max_tiles:
+			self.tiles.popitem(last=False)
+		return surf
+
+	# Draws the layer onto surf, with the point (x, y) of the layer at the top left corner of surf. Covers all of surf.
+	def draw(self, surf, x, y):
+		ts = self.tile_size
+		for tx in range(x // ts, (x + surf.get_width() - 1) // ts + 1):
+			for ty in range(y // ts, (y + surf.get_height() - 1) // ts + 1):
+				tile = self.tile(tx, ty)
+				if tile is None:
+					surf.fill(self.background, (tx*ts - x, ty*ts - y, ts, ts))
+				else:
+					surf.blit(tile, (tx*ts - x, ty*ts - y))
+
+# A rect in world units that, unlike pg.Rect, isn't rounded to whole units. Has the fields of pg.Rect that the camera reads, and is never changed.
+class float_rect:
+	def __init__(self, x, y, w, h):
+		self.x = self.left = x
+		self.y = self.top = y
+		self.w = self.width = w
+		self.h = self.height = h
 
 # Camera designed for fighter games.
 class camera:
 	# Takes pg rect in world coordinates and surf to render to
-	def __init__(self, rect, surf):
+	# Scaled images are cached in up to cache_bytes of memory. See scale_cache.
+	# If prerender is set, platforms are drawn from a stage_layer, which is redrawn whenever the zoom has changed by more than
+	# the fraction zoom_threshold since it was drawn. In between, the layer is stretched to fit the view.
+	# The layer covers the whole screen, so render() also clears the screen to background, and filling it beforehand is unnecessary.
+	def __init__(self, rect, surf, cache_bytes=64*1024*1024, prerender=False, zoom_threshold=0.1, background=(0, 0, 0)):
 		self.t = pg.Rect(rect)
 		self.c = pg.Rect(rect)
+
+		# Where the camera was before the last tick().
+		self.prev_c = pg.Rect(rect)
+
 		self.aspect = self.t.width / self.t.height
 		self.s = surf
+		self.scaled = scale_cache(cache_bytes)
+
+		self.prerender = prerender
+		self.zoom_threshold = zoom_threshold
+		self.background = background
+		self.layer = None
+
+		# The part of the layer in view, the same stretched to the screen, and the view they were made for.
+		self.layer_cut = None
+		self.layer_view = None
+		self.layer_view_key = None
+
+		# The view and fighter rects of the last render_dirty(), whose drawing is still on the screen.
+		self.drawn_view = None
+		self.drawn_rects = []
 
 	# Change the target based on the passed fight
 	def set_target_from_fight(self, f):
@@ -400,10 +1026,10 @@ class camera:
 		My = -1000
 
 		for c in f.fighters:
-			mx = min(mx, c.stance.hb.left() + c.pos.x)
-			Mx = max(Mx, c.stance.hb.right() + c.pos.x)
-			my = min(my, c.stance.hb.top() + c.pos.y)
-			My = max(My, c.stance.hb.bottom() + c.pos.y)
+			mx = min(mx, (c.stance.hb.left() + c.pos.x) / f.one)
+			Mx = max(Mx, (c.stance.hb.right() + c.pos.x) / f.one)
+			my = min(my, (c.stance.hb.top() + c.pos.y) / f.one)
+			My = max(My, (c.stance.hb.bottom() + c.pos.y) / f.one)
 
 		self.view_rect((mx-100, my-100, (Mx-mx)+200, (My-my)+200))
 
@@ -433,58 +1059,218 @@ class camera:
 
 		self.set_target(n_t)
 
-	# Render the given map from this camera.	
-	def render(self, m, debug=False):
+	# Render the given map from this camera.
+	# Only the platforms and fighters in view are drawn.
+	# By default, the camera eases towards its target once per render. When the simulation runs at its own rate (see clock.fixed_step),
+	# call tick() after every fight.update() instead, and pass blend, the fraction of the time between updates that has passed since the last one.
+	# The camera and fighters are then drawn that fraction of the way from where they were before the last update to where they are now.
+	def render(self, m, debug=False, blend=None):
+		if blend is None:
+			self.ease()
+			self.draw(m, debug)
+		else:
+			c = self.c
+			self.c = self.blended_view(blend)
+			self.draw(m, debug, blend=blend)
+			self.c = c
+		self.drawn_view = None
+
+	# Moves the camera a step towards its target.
+	def ease(self):
 		self.c.x = lerp(self.c.x, self.t.x, 0.1)
 		self.c.y = lerp(self.c.y, self.t.y, 0.1)
 		self.c.w = lerp(self.c.w, self.t.w, 0.1)
 		self.c.h = lerp(self.c.h, self.t.h, 0.1)
 
+	# Eases the camera towards its target, remembering where it was for blended renders. Call once per simulation step.
+	def tick(self):
+		self.prev_c = pg.Rect(self.c)
+		self.ease()
+
+	# Returns the view blend of the way from where it was before the last tick() to where it is now.
+	# It is a float_rect rather than a pg.Rect, so that the camera glides between whole world units instead of stepping across them.
+	def blended_view(self, blend):
+		p = self.prev_c
+		return float_rect(lerp(p.x, self.c.x, blend), lerp(p.y, self.c.y, blend), lerp(p.w, self.c.w, blend), lerp(p.h, self.c.h, blend))
+
+	# Draws the map as seen by the camera where it is now, leaving the screen outside of the clip rect untouched.
+	# Fighters are drawn blend of the way between their last two positions.
+	# layout is what fighter_layout() returned for the same arguments this frame, or None to work it out here.
+	def draw(self, m, debug=False, clip=None, blend=1, layout=None):
+		prof = profiler.current
+		if prof is not None:
+			t = profiler.clock()
+
+		if clip is None:
+			clip = self.s.get_rect()
+
+		if self.prerender:
+			self.draw_stage(m)
+		else:
+			for p in self.platforms_in(m, clip):
+				self.draw_platform(p)
+		if prof is not None:
+			t = prof.lap("camera.platforms", t)
+
+		if layout is None:
+			layout = self.fighter_layout(m, debug, blend)
+		for f, rects, bounds in layout:
+			if bounds.colliderect(clip):
+				self.draw_fighter(f, rects, debug)
+		if prof is not None:
+			prof.lap("camera.fighters", t)
+
+	# Returns the platforms of the map that may be drawn inside rect on the screen, in the order they were added.
+	def platforms_in(self, m, rect):
+		# Screen rects are truncated when drawn, so look a couple of pixels further out in every direction.
+		margin_x = 2 * self.c.width  / self.s.get_width()
+		margin_y = 2 * self.c.height / self.s.get_height()
+
+		left   = self.c.left + rect.left   / self.s.get_width()  * self.c.width  - margin_x
+		right  = self.c.left + rect.right  / self.s.get_width()  * self.c.width  + margin_x
+		top    = self.c.top  + rect.top    / self.s.get_height() * self.c.height - margin_y
+		bottom = self.c.top  + rect.bottom / self.s.get_height() * self.c.height + margin_y
+
+		return m.platforms_near((left * m.one, top * m.one, right * m.one, bottom * m.one))
+
+	def draw_platform(self, p):
 		scale_x = self.s.get_width()  / self.c.width
 		scale_y = self.s.get_height() / self.c.height
-		
-		for p in m.platforms:
-			img_x = (p.rect.left - self.c.left) / self.c.width	* self.s.get_width()
-			img_y = (p.rect.top	- self.c.top)  / self.c.height * self.s.get_height()
-			img_w = p.rect.width * scale_x
-			img_h = p.rect.height * scale_y
-
-			if p.image == None:
-				debug_rect(self.s, (40, 40, 200), pg.Rect(img_x, img_y, img_w, img_h), "Platform")
-			else:
-				self.s.blit(pg.transform.scale(p.image, (int(img_w), int(img_h))), (img_x, img_y))
-		
+
+		img_x = (p.rect.left - self.c.left) / self.c.width	* self.s.get_width()
+		img_y = (p.rect.top	- self.c.top)  / self.c.height * self.s.get_height()
+		draw_platform(self.s, p, img_x, img_y, scale_x, scale_y, self.scaled)
+
+	# Draws every platform from the stage layer, redrawing the layer first if the zoom has changed too much or platforms were added.
+	def draw_stage(self, m):
+		scale_x = self.s.get_width()  / self.c.width
+		scale_y = self.s.get_height() / self.c.height
+
+		if self.layer is None or not self.layer.fits(m, scale_x, scale_y, self.zoom_threshold):
+			self.layer = stage_layer(m, scale_x, scale_y, self.scaled, self.background)
+			self.layer_view_key = None
+		layer = self.layer
+
+		x = round(self.c.left * layer.scale_x)
+		y = round(self.c.top * layer.scale_y)
+		if scale_x == layer.scale_x and scale_y == layer.scale_y:
+			layer.draw(self.s, x, y)
+			return
+
+		# At any other zoom, the view is cut from the layer at the layer's scale and stretched to the screen, which is kept until the view changes.
+		key = (self.c.x, self.c.y, self.c.w, self.c.h, self.s.get_size())
+		if key != self.layer_view_key:
+			size = (math.ceil(self.c.w * layer.scale_x), math.ceil(self.c.h * layer.scale_y))
+			if self.layer_cut is None or self.layer_cut.get_size() != size:
+				self.layer_cut = pg.Surface(size)
+			if self.layer_view is None or self.layer_view.get_size() != self.s.get_size():
+				self.layer_view = pg.Surface(self.s.get_size())
+
+			layer.draw(self.layer_cut, x, y)
+			pg.transform.scale(self.layer_cut, self.s.get_size(), self.layer_view)
+			self.layer_view_key = key
+		self.s.blit(self.layer_view, (0, 0))
+
+	# Returns the screen rects of the fighter's sprite, and, if debug is set, its pos marker and attack hitboxes.
+	# Fixed point positions and colliders of deterministic fights are converted to world units by dividing them by one.
+	def fighter_rects(self, f, one, debug=False, blend=1):
+		scale_x = self.s.get_width()  / self.c.width
+		scale_y = self.s.get_height() / self.c.height
+
+		pos_x, pos_y = f.blended_pos(blend)
+		pos_x /= one
+		pos_y /= one
+
+		img_x = (f.rect.left + pos_x - self.c.left) / self.c.width  * self.s.get_width()
+		img_y = (f.rect.top	 + pos_y - self.c.top)  / self.c.height * self.s.get_height()
+		img_w = f.rect.width * scale_x
+		img_h = f.rect.height * scale_y
+		rects = [(img_x, img_y, img_w, img_h)]
+
+		if debug:
+			img_x = (pos_x - self.c.left) / self.c.width  * self.s.get_width()
+			img_y = (pos_y - self.c.top)  / self.c.height * self.s.get_height()
+			rects.append((img_x, img_y))
+
+			if f.atk != None:
+				for anim in f.atk.anim:
+					c = anim.get_col(f.atk_frame, f.facing)
+					if type(c) == Rectangle:
+						img_x = (c.mx / one + pos_x - self.c.left) / self.c.width  * self.s.get_width()
+						img_y = (c.my / one + pos_y - self.c.top)  / self.c.height * self.s.get_height()
+						img_w = (c.Mx - c.mx) / one * scale_x
+						img_h = (c.My - c.my) / one * scale_y
+						rects.append((img_x, img_y, img_w, img_h))
+		return rects
+
+	# Returns a (fighter, rects, bounds) tuple for each fighter of the map, where rects are its fighter_rects() and bounds is a screen rect
+	# around everything draw_fighter() draws from them. Working these out once a frame saves doing it again for every dirty rect.
+	def fighter_layout(self, m, debug=False, blend=1):
+		layout = []
 		for f in m.fighters:
-			img_x = (f.rect.left + f.pos.x - self.c.left) / self.c.width  * self.s.get_width()
-			img_y = (f.rect.top	 + f.pos.y - self.c.top)  / self.c.height * self.s.get_height()
-			img_w = f.rect.width * scale_x
-			img_h = f.rect.height * scale_y
+			rects = self.fighter_rects(f, m.one, debug, blend)
+			layout.append((f, rects, fighter_bounds(rects)))
+		return layout
+
+	def draw_fighter(self, f, rects, debug=False):
+		img_x, img_y, img_w, img_h = rects[0]
+		if f.image == None:
+			debug_rect(self.s, (180, 180, 40), pg.Rect(img_x, img_y, img_w, img_h), "Fighter")
+		else:
+			self.s.blit(self.scaled.get(f.image, int(img_w), int(img_h)), (img_x, img_y))
+
+		if debug:
+			prof = profiler.current
+			if prof is not None:
+				t = profiler.clock()
+
+			# Draw point at this fighter's pos
+			pg.draw.circle(self.s, (180, 180, 40), rects[1], 2)
+
+			# Draw attack hitboxes.
+			for img_x, img_y, img_w, img_h in rects[2:]:
+				debug_rect(self.s, (240, 40, 40), pg.Rect(img_x, img_y, img_w, img_h), "atk")
+
+			if prof is not None:
+				prof.lap("camera.debug", t)
+
+	# Renders like render(), but only redraws the parts of the screen that may have changed since the last call to this, and returns them
+	# as a list of rects for pg.display.update(). Unlike render(), this clears the screen itself, to the background color.
+	# extra is a list of screen rects the caller will draw over afterwards, such as a HUD, or None. They are redrawn every call, so the caller can draw on them again.
+	# Everything is redrawn when the camera moves, on the first call, and after render() is called. blend is as for render().
+	def render_dirty(self, m, debug=False, background=(0, 0, 0), extra=None, blend=None):
+		c = self.c
+		if blend is None:
+			self.ease()
+			blend = 1
+		else:
+			self.c = self.blended_view(blend)
 
-			if f.image == None:
-				debug_rect(self.s, (180, 180, 40), pg.Rect(img_x, img_y, img_w, img_h), "Fighter")
-			else:
-				self.s.blit(pg.transform.scale(f.image, (int(img_w), int(img_h))), (img_x, img_y))
-
-			if debug:
-				# Draw point at this fighter's pos
-				img_x = (f.pos.x - self.c.left) / self.c.width  * self.s.get_width()
-				img_y = (f.pos.y - self.c.top)  / self.c.height * self.s.get_height()
-				pg.draw.circle(self.s, (180, 180, 40), (img_x, img_y), 2)
-
-				# Draw attack hitboxes.
-				if f.atk != None:
-					for anim in f.atk.anim:
-						c = anim.get_col(f.atk.frame)
-						if type(c) == Rectangle:
-							if f.facing == 1:
-								img_x = (c.mx + f.pos.x  - self.c.left) / self.c.width  * self.s.get_width()
-							else:
-								img_x = (-c.Mx + f.pos.x - self.c.left) / self.c.width  * self.s.get_width()
-							img_y = (c.my + f.pos.y - self.c.top)  / self.c.height * self.s.get_height()
-							img_w = (c.Mx - c.mx) * scale_x
-							img_h = (c.My - c.my) * scale_y
-
-							debug_rect(self.s, (240, 40, 40), pg.Rect(img_x, img_y, img_w, img_h), "atk")
+		view = (self.c.x, self.c.y, self.c.w, self.c.h, self.s.get_size())
+		layout = self.fighter_layout(m, debug, blend)
+		rects = [bounds for f, fighter_rects, bounds in layout]
+
+		if view != self.drawn_view:
+			self.s.fill(background)
+			self.draw(m, debug, blend=blend, layout=layout)
+			dirty = [self.s.get_rect()]
+		else:
+			dirty = []
+			for r in self.drawn_rects + rects + [pg.Rect(r) for r in (extra or [])]:
+				r = r.clip(self.s.get_rect())
+				if r.w > 0 and r.h > 0:
+					dirty.append(r)
+
+			for r in dirty:
+				self.s.set_clip(r)
+				self.s.fill(background, r)
+				self.draw(m, debug, r, blend, layout)
+			self.s.set_clip(None)
+
+		self.c = c
+		self.drawn_view = view
+		self.drawn_rects = rects
+		return dirty
 
 
 
@@ -0,0 +1,34 @@
+import pygame as pg
+
+# Fonts that are loaded once and kept, since loading a system font takes milliseconds.
+# pg.quit() frees every font, and using one afterwards crashes, so they are all dropped when pygame quits and loaded again after the next init.
+# Anything made with them, like cached text sizes or rendered text, has to go too. Register a function that clears it with on_quit().
+
+# Maps (name, size) to the loaded font.
+loaded = {}
+
+# Functions called when the fonts are dropped.
+quit_hooks = []
+
+# Returns pg.font.SysFont(name, size), loading it the first time it is asked for since pygame was initialized.
+def sysfont(name, size):
+	key = (tuple(name) if isinstance(name, list) else name, size)
+	font = loaded.get(key)
+	if font is None:
+		# pygame forgets quit functions once it has called them, so this registers again after every init.
+		if len(loaded) == 0:
+			pg.register_quit(forget)
+		font = pg.font.SysFont(name, size)
+		loaded[key] = font
+	return font
+
+# Has f called whenever the fonts are dropped. Returns f, so it can be used as a decorator.
+def on_quit(f):
+	quit_hooks.append(f)
+	return f
+
+# Drops every font and everything registered as made from them.
+def forget():
+	loaded.clear()
+	for f in quit_hooks:
+		f()
@@ -0,0 +1,171 @@
+import random
+from fighter import *
+
+# Move sets and stages shared by the game, the benchmarks, the tests and the headless tools.
+
+# Builds the basic three-hit jab combo and returns its Standing stance, which the other stances link back to.
+def jab_combo():
+	# Define Hitboxes, Stances, Attacks, & Connections
+	standing_hb = Hitbox(Rectangle(-12, -75, 12, 0))
+
+	Standing = stance(standing_hb)
+	Jab1 = stance(standing_hb, Standing, 6)
+	Jab2 = stance(standing_hb, Standing, 6)
+
+	atk_anim1 = collider_anim()
+	atk_anim1.add_col(Rectangle(12, -55, 22, -45), 4, 0)
+	atk_anim1.add_col(Rectangle(12, -55, 42, -45), 4, 2)
+	atk_anim1.add_col(Rectangle(12, -55, 42, -45), 4, 4)
+
+	atk_anim2 = collider_anim()
+	atk_anim2.add_col(Rectangle(12, -45, 22, -35), 4, 0)
+	atk_anim2.add_col(Rectangle(12, -45, 42, -35), 4, 2)
+	atk_anim2.add_col(Rectangle(12, -45, 42, -35), 4, 4)
+
+	atk_anim3 = collider_anim()
+	atk_anim3.add_col(Rectangle(12, -50, 12, -40), 8, 4)
+	atk_anim3.add_col(Rectangle(12, -50, 47, -40), 8, 7)
+	atk_anim3.add_col(Rectangle(12, -50, 47, -40), 8, 10)
+
+	atk1 = attack(4)
+	atk1.add_anim(atk_anim1)
+
+	atk2 = attack(4)
+	atk2.add_anim(atk_anim2)
+
+	atk3 = attack(10)
+	atk3.add_anim(atk_anim3)
+
+	atk1.compile()
+	atk2.compile()
+	atk3.compile()
+
+	Standing.add_connection(Jab1, fighter.BASIC, transition_time=4, time_in=3, time_out=None, atk=atk1)
+	Jab1.add_connection(Jab2, fighter.BASIC, transition_time=4, time_in=3, time_out=None, atk=atk2)
+	Jab2.add_connection(Standing, fighter.BASIC, transition_time=10, time_in=3, time_out=None, atk=atk3)
+
+	return Standing
+
+# Builds the default stage with one fighter per team, both starting in the passed stance (jab_combo() by default).
+# Fighter 0 starts on the left and fighter 1 on the right. See fight for deterministic.
+def standard_fight(start=None, deterministic=False):
+	if start is None:
+		start = jab_combo()
+
+	f = fight(deterministic=deterministic)
+	f.add_platform(pg.Rect(-500, 300, 1000, 20))
+	f.add_platform(pg.Rect(-400, 150, 200, 20))
+	f.add_platform(pg.Rect(200, 150, 200, 20))
+
+	f.add_fighter(pg.Rect(-12, -75, 24, 75), start, team=0)
+	f.add_fighter(pg.Rect(-12, -75, 24, 75), start, team=1)
+	f.fighters[0].pos.x = -300 * f.one
+	f.fighters[1].pos.x = 300 * f.one
+	return f
+
+# Attack used by crowd(). Reaches 12 to 42 units in front of the fighter.
+def jab():
+	anm = collider_anim()
+	anm.add_col(Rectangle(12, -55, 22, -45), 4, 0)
+	anm.add_col(Rectangle(12, -55, 42, -45), 4, 2)
+	anm.add_col(Rectangle(12, -55, 42, -45), 4, 4)
+
+	atk = attack(4)
+	atk.add_anim(anm)
+	atk.compile()
+	return atk
+
+# Fight with n fighters on two teams spread along x, about one every spacing units, all in the middle of a jab.
+def crowd(n, seed=0, spacing=50):
+	rnd = random.Random(seed)
+	s = stance(Hitbox(Rectangle(-12, -75, 12, 0)))
+	atk = jab()
+
+	f = fight()
+	for i in range(n):
+		a = f.add_fighter(pg.Rect(-12, -75, 24, 75), s, team=i % 2)
+		a.pos.x = rnd.uniform(0, n*spacing)
+		a.facing = rnd.choice([-1, 1])
+		a.attack(atk)
+		a.atk_frame = 3
+	return f
+
+# The attack tests fight.update() used to run: every attacker against every defender.
+def attack_hits_all_pairs(f):
+	hits = []
+	for a in f.fighters:
+		for b in f.fighters:
+			if b.team == a.team or a in b.immunities or a.atk == None:
+				continue
+			dmg = a.attack_damage(b)
+			if dmg > 0:
+				hits.append((a, b, dmg))
+	return hits
+
+# Random move graph of n_stances stances joined by n_connections connections with random triggers and time windows.
+def move_graph(n_stances, n_connections, seed=0):
+	rnd = random.Random(seed)
+	hb = Hitbox(Rectangle(-12, -75, 12, 0))
+	stances = [stance(hb) for i in range(n_stances)]
+	for i in range(n_connections):
+		ti = rnd.randint(0, 20)
+		to = rnd.choice([None, ti + rnd.randint(1, 20)])
+		rnd.choice(stances).add_connection(rnd.choice(stances), rnd.randint(0, 4), time_in=ti, time_out=to)
+	return stances
+
+# Per-frame controls for n frames of a 2-fighter match, where each control flips state about every 10 frames.
+def random_inputs(n, seed=0):
+	rnd = random.Random(seed)
+	inputs = []
+	held = [[False]*5, [False]*5]
+	for i in range(n):
+		for vals in held:
+			for c in range(5):
+				if rnd.random() < 0.1:
+					vals[c] = not vals[c]
+		inputs.append([list(vals) for vals in held])
+	return inputs
+
+# Per-frame controls for n frames of a 2-fighter match where the fighters walk toward each other and attack, so that hits land.
+# The inputs are recorded from a match played with them, and replaying them into another fight gives the same match only if it is deterministic.
+def brawl_inputs(n, seed=0):
+	rnd = random.Random(seed)
+	inputs = []
+
+	def play(f):
+		frame_inputs = []
+		for me, other in [(f.fighters[0], f.fighters[1]), (f.fighters[1], f.fighters[0])]:
+			d = (other.pos.x - me.pos.x) / f.one
+			frame_inputs.append([rnd.random() < 0.05, d < -30, d > 30, rnd.random() < 0.1, rnd.random() < 0.4])
+		inputs.append(frame_inputs)
+		return frame_inputs
+
+	standard_fight().simulate(n, play)
+	return inputs
+
+# Stage with n_platforms platforms that have images, including some large ones standing in for background art.
+def art_stage(n_platforms=12, seed=0):
+	rnd = random.Random(seed)
+	f = fight()
+	for i in range(n_platforms):
+		w = 1200 if i < 3 else 300
+		h = 700 if i < 3 else 40
+		img = pg.Surface((w, h))
+		img.fill((rnd.randint(0, 255), rnd.randint(0, 255), rnd.randint(0, 255)))
+		f.add_platform(pg.Rect(rnd.randint(-800, 800) - w//2, rnd.randint(-400, 400) - h//2, w, h), img)
+
+	s = stance(Hitbox(Rectangle(-12, -75, 12, 0)))
+	for i in range(2):
+		img = pg.Surface((24, 75))
+		img.fill((200, 200, 40))
+		a = f.add_fighter(pg.Rect(-12, -75, 24, 75), s, team=i, surf=img)
+		a.pos.x = -200 + 400*i
+	return f
+
+# Copy of hb flipped along x if facing is -1 and then moved by pos.
+def transformed_copy(hb, facing, pos):
+	hb = hb.copy()
+	if facing == -1:
+		hb.flip_x()
+	hb.move(pos)
+	return hb
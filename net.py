@@ -0,0 +1,265 @@
+import asyncio
+import random
+import socket
+import struct
+from collections import deque
+
+# Transports for sending messages between peers.
+# A transport has send(data), which sends one message of bytes, and receive(), which returns a list of every message that has arrived since the last call.
+# Neither ever blocks. Messages may be lost or reordered, so users must tolerate both.
+
+# -------- Stream Framing --------
+# Messages sent over a stream are each prefixed by their length as a 2 byte integer.
+
+def frame(data):
+	return struct.pack("<H", len(data)) + data
+
+# Splits the whole messages off the front of buf. Returns (messages, the remaining bytes).
+def unframe(buf):
+	msgs = []
+	start = 0
+	while len(buf) - start >= 2:
+		n = struct.unpack_from("<H", buf, start)[0]
+		if len(buf) - start < n + 2:
+			break
+		msgs.append(bytes(buf[start+2:start+2+n]))
+		start += n + 2
+	return msgs, buf[start:]
+
+# -------- Transports --------
+
+# In-memory stand-in for a network between two peers, with injectable latency, jitter and packet loss.
+# Time is measured in ticks, which only pass when tick() is called, so runs are reproducible.
+# Messages take delay ticks plus up to jitter more to arrive, and each is lost with probability loss.
+class loopback_link:
+	def __init__(self, delay=0, jitter=0, loss=0, seed=0):
+		self.delay = delay
+		self.jitter = jitter
+		self.loss = loss
+		self.rnd = random.Random(seed)
+		self.time = 0
+
+		# The two ends of the link. Messages sent on one arrive on the other.
+		self.a = loopback_transport(self)
+		self.b = loopback_transport(self)
+		self.a.peer = self.b
+		self.b.peer = self.a
+
+	def tick(self):
+		self.time += 1
+
+# One end of a loopback_link.
+class loopback_transport:
+	def __init__(self, link):
+		self.link = link
+		self.peer = None
+
+		# Messages on their way to this end, as (arrival time, message) pairs.
+		self.in_flight = []
+
+	def send(self, data):
+		link = self.link
+		if link.rnd.random() < link.loss:
+			return
+		arrival = link.time + link.delay + link.rnd.randint(0, link.jitter)
+		self.peer.in_flight.append((arrival, bytes(data)))
+
+	def receive(self):
+		msgs = [m for t, m in self.in_flight if t <= self.link.time]
+		self.in_flight = [(t, m) for t, m in self.in_flight if t > self.link.time]
+		return msgs
+
+# -------- Asyncio Transports --------
+# These are driven by a running asyncio event loop instead of being polled. Incoming data is queued by the loop's callbacks
+# whenever the game awaits (for example, while it sleeps until the next frame), and receive() only empties the queue.
+# Use serve() and connect() to open them.
+
+# Transport over UDP, which never holds up newer messages behind lost ones like TCP does.
+# Every message gets a sequence number, and each datagram also carries the last redundancy messages sent before it,
+# so a lost datagram is usually recovered by the next one without waiting on a resend. Duplicates are dropped on receipt.
+class udp_transport(asyncio.DatagramProtocol):
+	# Each message in a datagram is its sequence number and length, followed by its bytes.
+	message_header = struct.Struct("<IH")
+
+	# A datagram of just this is a hello, which is too short to hold a message.
+	hello_message = b"h"
+
+	# Sequence numbers this far behind the newest one received are assumed to be stale and are dropped.
+	window = 256
+
+	# On the server, connected is a future that is set to this transport once a client says hello.
+	def __init__(self, redundancy=3, connected=None):
+		self.redundancy = redundancy
+		self.connected = connected
+		self.transport = None
+
+		# Address to send to. The server learns it from the client's hello, and the client's socket is already connected to it.
+		self.peer = None
+
+		# Set once anything has been heard from the other end.
+		self.answered = False
+
+		# Sequence number of the next message sent, and the most recent messages sent as (seq, data) pairs.
+		self.seq = 0
+		self.recent = deque(maxlen=redundancy + 1)
+
+		# Messages received but not yet returned by receive(), the sequence numbers received recently, and the newest of them.
+		self.inbox = []
+		self.seen = set()
+		self.newest = -1
+
+		self.closed = False
+
+	def connection_made(self, transport):
+		self.transport = transport
+
+	# Datagrams that are neither a hello nor whole messages are dropped, like lost ones.
+	def datagram_received(self, data, addr):
+		if self.connected is not None:
+			if self.peer is None:
+				# Only a hello makes its sender the peer. The client may also have connected over TCP already,
+				# in which case this transport is being closed.
+				if data != self.hello_message or self.connected.done():
+					return
+				self.peer = addr
+				self.connected.set_result(self)
+			elif addr != self.peer:
+				return
+
+		# The server answers each hello in kind.
+		if data == self.hello_message:
+			self.answered = True
+			if self.connected is not None:
+				self.hello()
+			return
+
+		msgs = self.parse(data)
+		if msgs is None:
+			return
+		self.answered = True
+
+		for seq, msg in msgs:
+			if seq not in self.seen and seq > self.newest - self.window:
+				self.seen.add(seq)
+				self.inbox.append(msg)
+			if seq > self.newest:
+				self.newest = seq
+
+		if len(self.seen) > 2*self.window:
+			self.seen = {s for s in self.seen if s > self.newest - self.window}
+
+	# Returns the messages in a datagram as (seq, data) pairs, or None if one of them is cut short.
+	def parse(self, data):
+		msgs = []
+		start = 0
+		while start < len(data):
+			if start + self.message_header.size > len(data):
+				return None
+			seq, n = self.message_header.unpack_from(data, start)
+			start += self.message_header.size
+			if start + n > len(data):
+				return None
+			msgs.append((seq, data[start:start+n]))
+			start += n
+		return msgs
+
+	def connection_lost(self, exc):
+		self.closed = True
+
+	def hello(self):
+		self.transport.sendto(self.hello_message, self.peer)
+
+	def send(self, data):
+		self.recent.append((self.seq, bytes(data)))
+		self.seq += 1
+		if self.connected is not None and self.peer is None:
+			return
+
+		# Oldest first, so that the receiver gets messages in order whenever none are reordered.
+		out = bytearray()
+		for seq, msg in self.recent:
+			out += self.message_header.pack(seq, len(msg))
+			out += msg
+		self.transport.sendto(bytes(out), self.peer)
+
+	def receive(self):
+		msgs = self.inbox
+		self.inbox = []
+		return msgs
+
+	def close(self):
+		self.transport.close()
+
+# Transport over TCP, for networks that block UDP. Messages are framed with frame() and unframe().
+class stream_transport(asyncio.Protocol):
+	# On the server, connected is a future that is set to this transport once a client connects.
+	def __init__(self, connected=None):
+		self.connected = connected
+		self.transport = None
+		self.buf = b""
+		self.inbox = []
+		self.closed = False
+
+	def connection_made(self, transport):
+		self.transport = transport
+		transport.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		if self.connected is not None and not self.connected.done():
+			self.connected.set_result(self)
+
+	def data_received(self, data):
+		msgs, self.buf = unframe(self.buf + data)
+		self.inbox += msgs
+
+	def connection_lost(self, exc):
+		self.closed = True
+
+	# Writes are buffered by the event loop, so this never blocks.
+	def send(self, data):
+		if not self.closed:
+			self.transport.write(frame(data))
+
+	def receive(self):
+		msgs = self.inbox
+		self.inbox = []
+		return msgs
+
+	# Returns the number of bytes sent but not yet written to the socket.
+	def buffered(self):
+		if self.transport is None:
+			return 0
+		return self.transport.get_write_buffer_size()
+
+	def close(self):
+		self.transport.close()
+
+# Waits for a client to connect() on the given port, over UDP or TCP, and returns the transport.
+async def serve(ip, port, redundancy=3):
+	loop = asyncio.get_running_loop()
+	connected = loop.create_future()
+
+	_, udp = await loop.create_datagram_endpoint(lambda: udp_transport(redundancy, connected), local_addr=(ip, port))
+	server = await loop.create_server(lambda: stream_transport(connected), ip, port)
+
+	transport = await connected
+	server.close()
+	if transport is not udp:
+		udp.close()
+	return transport
+
+# Connects to a server started with serve() and returns the transport.
+# Tries UDP first, and falls back to TCP if the server doesn't answer a hello within timeout seconds or udp is False.
+async def connect(ip, port, redundancy=3, timeout=1.0, udp=True):
+	loop = asyncio.get_running_loop()
+
+	if udp:
+		_, t = await loop.create_datagram_endpoint(lambda: udp_transport(redundancy), remote_addr=(ip, port))
+		deadline = loop.time() + timeout
+		while loop.time() < deadline:
+			t.hello()
+			await asyncio.sleep(0.05)
+			if t.answered:
+				return t
+		t.close()
+
+	_, t = await loop.create_connection(stream_transport, ip, port)
+	return t
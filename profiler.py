@@ -0,0 +1,130 @@
+import csv
+import json
+import time
+import collections
+import pygame as pg
+import fonts
+
+# Opt-in profiler showing where the time of each frame goes.
+# Instrumented code only times its phases while a profiler is enabled, and otherwise just checks that none is, so it costs next to nothing when off.
+# The time spent in each phase is summed over a frame, and the totals of the last history frames are kept for stats() and the dumps.
+# Phases are named "area.phase" and may nest. For example, fight.fighters includes all of the fighter.* phases.
+#
+# Instrumenting a phase looks like:
+#   prof = profiler.current
+#   if prof is not None:
+#       t = profiler.clock()
+#   ...
+#   if prof is not None:
+#       t = prof.lap("area.phase", t)
+
+# The enabled profiler, or None.
+current = None
+
+clock = time.perf_counter
+
+def enable(history=300):
+	global current
+	current = frame_profiler(history)
+	return current
+
+def disable():
+	global current
+	current = None
+
+# Returns the value at percentile p of the sorted list values.
+def percentile(values, p):
+	return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def overlay_font():
+	return fonts.sysfont("monospace", 14)
+
+class frame_profiler:
+	def __init__(self, history=300):
+		self.history = history
+
+		# Maps each phase to the seconds spent in it on each recent frame, and to the seconds spent in it so far this frame.
+		self.phases = {}
+		self.current = {}
+
+		# Number of frames ended so far.
+		self.frames = 0
+
+		# The overlay drawn by draw(), and the frame it was made on.
+		self.overlay = None
+		self.overlay_frame = None
+
+	# Adds the time since t to phase and returns the current time, so that back to back phases need only one clock read each.
+	def lap(self, phase, t):
+		now = clock()
+		self.current[phase] = self.current.get(phase, 0) + (now - t)
+		return now
+
+	# Records the totals of the frame. Call once per frame, after everything in it.
+	def end_frame(self):
+		for phase, t in self.current.items():
+			if phase not in self.phases:
+				self.phases[phase] = collections.deque(maxlen=self.history)
+			self.phases[phase].append(t)
+
+		# Phases that didn't run this frame took no time.
+		for phase, times in self.phases.items():
+			if phase not in self.current:
+				times.append(0)
+
+		self.current = {}
+		self.frames += 1
+
+	# Returns a dict mapping each phase to (p50, p99, mean, max) of its seconds per frame over recent frames.
+	def stats(self):
+		ret = {}
+		for phase in sorted(self.phases):
+			times = sorted(self.phases[phase])
+			ret[phase] = (percentile(times, 50), percentile(times, 99), sum(times) / len(times), times[-1])
+		return ret
+
+	# Writes the stats and the times of each recent frame as JSON.
+	def dump_json(self, path):
+		data = {"frames": self.frames, "phases": {}}
+		for phase, (p50, p99, mean, worst) in self.stats().items():
+			data["phases"][phase] = {"p50": p50, "p99": p99, "mean": mean, "max": worst, "times": list(self.phases[phase])}
+		with open(path, "w") as f:
+			json.dump(data, f, indent=1)
+
+	# Writes the times of each recent frame as CSV, with a row per frame and a column per phase, oldest first.
+	# Phases first seen partway through have empty cells before then.
+	def dump_csv(self, path):
+		phases = sorted(self.phases)
+		n = max([len(self.phases[p]) for p in phases], default=0)
+		with open(path, "w", newline="") as f:
+			w = csv.writer(f)
+			w.writerow(["frame"] + phases)
+			for i in range(n):
+				row = [self.frames - n + i]
+				for p in phases:
+					times = self.phases[p]
+					j = i - (n - len(times))
+					row.append(times[j] if j >= 0 else "")
+				w.writerow(row)
+
+	# Draws a table of the stats in milliseconds onto surf with its top left corner at (x, y), and returns the rect drawn over.
+	# The table is only remade every refresh frames, so that drawing it barely shows up in the profile.
+	def draw(self, surf, x, y, refresh=15):
+		if self.overlay is None or self.frames - self.overlay_frame >= refresh:
+			self.overlay = self.render_overlay()
+			self.overlay_frame = self.frames
+		return surf.blit(self.overlay, (x, y))
+
+	def render_overlay(self):
+		font = overlay_font()
+		lines = ["%-22s %7s %7s %7s" % ("phase (ms)", "p50", "p99", "max")]
+		for phase, (p50, p99, mean, worst) in self.stats().items():
+			lines.append("%-22s %7.2f %7.2f %7.2f" % (phase, p50*1e3, p99*1e3, worst*1e3))
+
+		h = font.get_linesize()
+		w = max(font.size(line)[0] for line in lines)
+		overlay = pg.Surface((w + 8, h*len(lines) + 8))
+		overlay.fill((20, 20, 20))
+		for i in range(len(lines)):
+			overlay.blit(font.render(lines[i], False, (220, 220, 220)), (4, 4 + h*i))
+		return overlay
@@ -0,0 +1,242 @@
+import mmap
+import array
+import bisect
+import struct
+from fighter import *
+from rollback import pack_controls, unpack_controls
+
+# Binary replays of fights.
+# A replay is the controls of every fighter on every frame, plus a snapshot of the whole fight (a keyframe) every keyframe_interval frames.
+# Playing it back into a fight built the same way reproduces the match, and seeking restores the nearest keyframe and simulates forward from it.
+#
+# The file is a header followed by records, and written as the match is played. Each record is a one byte tag, followed by:
+#   K (keyframe): u32 frame, u32 number of doubles, then the doubles of fight.snapshot().
+#   I (inputs):   u32 first frame, u32 number of frames, then one byte of packed controls (see rollback.pack_controls()) per fighter per frame.
+#   X (index):    u32 number of frames, u32 number of keyframes, then (u32 frame, u64 offset of the K record) per keyframe.
+# The index is written last by replay_writer.close() and located by the trailer, the u64 offset of the X record followed by b"FRPX".
+# Replays without one, from matches that never closed their writer, are read by scanning every record instead.
+# All integers are little endian.
+
+header = struct.Struct("<4sHHI")
+magic = b"FRPL"
+version = 1
+
+record = struct.Struct("<cII")
+index_entry = struct.Struct("<IQ")
+trailer = struct.Struct("<Q4s")
+trailer_magic = b"FRPX"
+
+# Records a fight to a file as it is played.
+# Call record() every frame after the fighters' controls are set and before fight.update().
+# Inputs are written in records of block_frames frames, so a match that never closes its writer loses at most that many frames.
+class replay_writer:
+	def __init__(self, path, f, keyframe_interval=300, block_frames=30):
+		self.f = f
+		self.keyframe_interval = keyframe_interval
+		self.block_frames = block_frames
+		self.file = open(path, "wb")
+		self.file.write(header.pack(magic, version, len(f.fighters), keyframe_interval))
+
+		# Packed controls not yet written, and the frame of the first of them.
+		self.inputs = bytearray()
+		self.first = f.frame
+
+		self.frames = 0
+
+		# (frame, offset) of every keyframe, for the index.
+		self.keyframes = []
+
+	def record(self):
+		f = self.f
+		if f.frame % self.keyframe_interval == 0 or len(self.keyframes) == 0:
+			self.flush()
+			snap = f.snapshot()
+			self.keyframes.append((f.frame, self.file.tell()))
+			self.file.write(record.pack(b"K", f.frame, len(snap)))
+			self.file.write(snap.tobytes())
+
+		if len(self.inputs) == 0:
+			self.first = f.frame
+		for fi in f.fighters:
+			self.inputs.append(pack_controls(fi.controls))
+		self.frames = f.frame + 1
+
+		if len(self.inputs) >= self.block_frames * len(f.fighters):
+			self.flush()
+
+	# Writes the buffered inputs.
+	def flush(self):
+		if len(self.inputs) > 0:
+			self.file.write(record.pack(b"I", self.first, len(self.inputs) // len(self.f.fighters)))
+			self.file.write(self.inputs)
+			self.inputs = bytearray()
+		self.file.flush()
+
+	def close(self):
+		self.flush()
+		at = self.file.tell()
+		self.file.write(record.pack(b"X", self.frames, len(self.keyframes)))
+		for frame, offset in self.keyframes:
+			self.file.write(index_entry.pack(frame, offset))
+		self.file.write(trailer.pack(at, trailer_magic))
+		self.file.close()
+
+# A replay file opened for reading. The file is memory mapped, so only the parts that are used are ever read from disk.
+class replay:
+	def __init__(self, path):
+		self.path = path
+		self.file = open(path, "rb")
+		self.data = None
+
+		# Frame and offset of the snapshot of each keyframe, and the first frame, count and offset of the inputs of each input record.
+		self.keyframe_frames = []
+		self.keyframe_offsets = []
+		self.block_firsts = []
+		self.block_counts = []
+		self.block_offsets = []
+		self.frames = 0
+
+		# Nothing is left open if the file can't be read.
+		try:
+			self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+			if len(self.data) < header.size:
+				raise ValueError("\"%s\" is not a replay." % path)
+
+			m, v, self.n_fighters, self.keyframe_interval = header.unpack_from(self.data)
+			if m != magic:
+				raise ValueError("\"%s\" is not a replay." % path)
+			if v != version:
+				raise ValueError("Replay \"%s\" is version %d, but only version %d can be read." % (path, v, version))
+
+			if not self.read_index():
+				self.scan()
+		except:
+			self.close()
+			raise
+
+	# Loads the index. Returns False if there isn't one. Input records are found lazily by block_at().
+	def read_index(self):
+		if len(self.data) < header.size + trailer.size:
+			return False
+		at, m = trailer.unpack_from(self.data, len(self.data) - trailer.size)
+		if m != trailer_magic:
+			return False
+
+		# The index and every keyframe it points to must lie between the header and the trailer.
+		end = len(self.data) - trailer.size
+		if at < header.size or at + record.size > end:
+			raise ValueError("\"%s\" is corrupt." % self.path)
+		tag, self.frames, n = record.unpack_from(self.data, at)
+		if tag != b"X" or at + record.size + n*index_entry.size > end:
+			raise ValueError("\"%s\" is corrupt." % self.path)
+
+		for i in range(n):
+			frame, offset = index_entry.unpack_from(self.data, at + record.size + i*index_entry.size)
+			if offset < header.size or offset + record.size > at:
+				raise ValueError("\"%s\" is corrupt." % self.path)
+			self.keyframe_frames.append(frame)
+			self.keyframe_offsets.append(offset)
+		self.indexed = True
+		return True
+
+	# Finds every record by walking the file from the start. Stops at the index, or at a record cut short by the end of the file.
+	def scan(self):
+		self.indexed = False
+		i = header.size
+		while i + record.size <= len(self.data):
+			tag, a, n = record.unpack_from(self.data, i)
+			if tag == b"K":
+				end = i + record.size + n*8
+				if end > len(self.data):
+					break
+				self.keyframe_frames.append(a)
+				self.keyframe_offsets.append(i)
+			elif tag == b"I":
+				end = i + record.size + n*self.n_fighters
+				if end > len(self.data):
+					break
+				self.add_block(a, n, i + record.size)
+				self.frames = max(self.frames, a + n)
+			else:
+				break
+			i = end
+
+	def add_block(self, first, count, offset):
+		self.block_firsts.append(first)
+		self.block_counts.append(count)
+		self.block_offsets.append(offset)
+
+	# Returns (first frame, count, offset) of the input record holding frame i.
+	# With an index, input records are found by walking forward from the keyframe before them, and remembered.
+	def block_at(self, i):
+		b = bisect.bisect_right(self.block_firsts, i) - 1
+		if b >= 0 and i < self.block_firsts[b] + self.block_counts[b]:
+			return self.block_firsts[b], self.block_counts[b], self.block_offsets[b]
+		if not self.indexed:
+			raise IndexError("Frame %d is not in the replay." % i)
+
+		k = bisect.bisect_right(self.keyframe_frames, i) - 1
+		if k < 0:
+			raise IndexError("Frame %d is not in the replay." % i)
+		at = self.keyframe_offsets[k]
+		while True:
+			tag, a, n = record.unpack_from(self.data, at)
+			if tag == b"K":
+				at += record.size + n*8
+			elif tag == b"I":
+				if a <= i < a + n:
+					b = bisect.bisect_right(self.block_firsts, a)
+					self.block_firsts.insert(b, a)
+					self.block_counts.insert(b, n)
+					self.block_offsets.insert(b, at + record.size)
+					return a, n, at + record.size
+				at += record.size + n*self.n_fighters
+			else:
+				raise IndexError("Frame %d is not in the replay." % i)
+
+	# Returns the controls of every fighter on frame i, as a list of control tuples.
+	def inputs(self, i):
+		first, count, offset = self.block_at(i)
+		start = offset + (i - first) * self.n_fighters
+		return [unpack_controls(b) for b in self.data[start:start + self.n_fighters]]
+
+	# Returns the snapshot of keyframe k as an array for fight.restore().
+	def keyframe(self, k):
+		at = self.keyframe_offsets[k]
+		tag, frame, n = record.unpack_from(self.data, at)
+		snap = array.array("d")
+		snap.frombytes(self.data[at + record.size:at + record.size + n*8])
+		return snap
+
+	# Puts fight f in the state it was in when frame i was recorded, with that frame's controls set but the frame not yet simulated,
+	# by restoring the nearest keyframe before it and simulating forward. Seeking to frames is the state after the last frame.
+	# If f is already at or before frame i but after that keyframe, it simulates forward from where it is instead.
+	# f must be built the same way as the recorded fight.
+	def seek(self, f, i):
+		k = bisect.bisect_right(self.keyframe_frames, i) - 1
+		if k < 0:
+			raise IndexError("Frame %d is before the start of the replay." % i)
+		if i > self.frames:
+			raise IndexError("Frame %d is past the end of the replay." % i)
+
+		if not (self.keyframe_frames[k] <= f.frame <= i):
+			f.restore(self.keyframe(k))
+		while f.frame < i:
+			self.step(f)
+		if i < self.frames:
+			self.set_controls(f)
+
+	# Sets the controls of every fighter in f to the ones recorded for its current frame.
+	def set_controls(self, f):
+		for fi, vals in zip(f.fighters, self.inputs(f.frame)):
+			fi.set_controls(vals)
+
+	# Simulates the next frame of f with the recorded inputs.
+	def step(self, f):
+		self.set_controls(f)
+		f.update()
+
+	def close(self):
+		if self.data is not None:
+			self.data.close()
+		self.file.close()
@@ -0,0 +1,231 @@
+import profiler
+from fighter import *
+
+# Rollback netcode for two-player fights.
+# Every frame, each peer sends its inputs and simulates immediately, predicting that the remote player is still doing whatever they last did.
+# When the real remote inputs arrive and differ from the prediction, the fight is restored to a snapshot from before
+# the first mispredicted frame and re-simulated up to the present with the corrected inputs.
+
+# -------- Wire Format --------
+# A message holds the last frame of the receiver's inputs that the sender has (its ack), followed by the sender's inputs
+# for a run of consecutive frames. Inputs are sent until they are acked, so lost messages are recovered by later ones.
+#
+# Frame numbers are varints: 7 bits per byte, low bits first, with the high bit set on every byte but the last.
+# The ack is sent plus one, since it is -1 before anything has been received.
+# Each frame's five controls are packed into the low bits of one byte, with control c in bit c.
+# Players hold inputs for many frames at a time, so the frames are run-length encoded as (varint run length, packed byte) pairs.
+
+def write_varint(data, n):
+	while n >= 0x80:
+		data.append((n & 0x7f) | 0x80)
+		n >>= 7
+	data.append(n)
+
+# Returns (value, index of the byte after it).
+def read_varint(data, i):
+	n = 0
+	shift = 0
+	while True:
+		b = data[i]
+		i += 1
+		n |= (b & 0x7f) << shift
+		if b < 0x80:
+			return n, i
+		shift += 7
+
+def pack_controls(vals):
+	b = 0
+	for c in range(5):
+		if vals[c]:
+			b |= 1 << c
+	return b
+
+def unpack_controls(b):
+	return (b & 1, b >> 1 & 1, b >> 2 & 1, b >> 3 & 1, b >> 4 & 1)
+
+# Returns the bytes of a message. inputs is a list of control tuples for the frames starting at first.
+def encode_inputs(ack, first, inputs):
+	data = bytearray()
+	write_varint(data, ack + 1)
+	write_varint(data, first)
+
+	i = 0
+	while i < len(inputs):
+		b = pack_controls(inputs[i])
+		run = 1
+		while i + run < len(inputs) and inputs[i + run] == inputs[i]:
+			run += 1
+		write_varint(data, run)
+		data.append(b)
+		i += run
+	return bytes(data)
+
+# Most frames of inputs a message may hold. Sessions never send more than a few times max_rollback, so longer runs are corrupt.
+max_message_frames = 4096
+
+# Inverse of encode_inputs(). Returns (ack, first, inputs), or None if data is truncated or otherwise not a valid message.
+def decode_inputs(data):
+	try:
+		ack, i = read_varint(data, 0)
+		first, i = read_varint(data, i)
+
+		inputs = []
+		while i < len(data):
+			run, i = read_varint(data, i)
+			if run == 0 or len(inputs) + run > max_message_frames:
+				return None
+			inputs += [unpack_controls(data[i])] * run
+			i += 1
+	except IndexError:
+		return None
+	return ack - 1, first, inputs
+
+# -------- Session --------
+
+# Runs a fight between a local player and a remote one.
+# f is the fight, which must be built identically on both peers, and local is the index of the local player's fighter.
+# Both fighters must be the only two in the fight. transport is any transport from net.py.
+# Local inputs are applied input_delay frames after they are made, which gives them that long to reach the other peer before a rollback is needed.
+# The session never predicts more than max_rollback frames ahead of the last confirmed remote input. Past that, advance() waits.
+class rollback_session:
+	def __init__(self, f, local, transport, input_delay=2, max_rollback=8):
+		self.f = f
+		self.local = local
+		self.remote = 1 - local
+		self.transport = transport
+		self.input_delay = input_delay
+		self.max_rollback = max_rollback
+
+		# Inputs for each frame, as tuples of control values. Nobody presses anything during the first input_delay frames.
+		# Frame -1 is a placeholder so that there is always a last known input, even with no input delay.
+		none = (0, 0, 0, 0, 0)
+		self.local_inputs = {i: none for i in range(-1, input_delay)}
+		self.remote_inputs = {i: none for i in range(-1, input_delay)}
+
+		# Last frame for which every remote input is known, and last frame of local inputs the remote peer has acked.
+		self.remote_confirmed = input_delay - 1
+		self.remote_ack = input_delay - 1
+
+		# The remote inputs each simulated frame used, which are predictions for frames past remote_confirmed.
+		self.used_remote = {}
+
+		# Snapshots of the fight from before each frame that may still be rolled back.
+		self.snapshots = {}
+
+		# Number of frames re-simulated by rollbacks so far, and the number of ticks spent waiting for remote inputs.
+		self.rollback_frames = 0
+		self.stalls = 0
+
+	# Returns the remote input to use for frame i: the real one if it has arrived, or a prediction otherwise.
+	def remote_input(self, i):
+		vals = self.remote_inputs.get(i)
+		if vals is None:
+			vals = self.remote_inputs[self.remote_confirmed]
+		return vals
+
+	# Simulates the next frame with the inputs known for it.
+	def step(self):
+		i = self.f.frame
+		self.snapshots[i] = self.f.snapshot()
+
+		remote = self.remote_input(i)
+		self.used_remote[i] = remote
+		self.f.fighters[self.local].set_controls(self.local_inputs[i])
+		self.f.fighters[self.remote].set_controls(remote)
+		self.f.update()
+
+	# Handles the messages that have arrived. Returns the first frame that was simulated with a wrong prediction, or None.
+	# Malformed messages are dropped, like lost ones.
+	def receive(self):
+		rollback_to = None
+		for data in self.transport.receive():
+			msg = decode_inputs(data)
+			if msg is None:
+				continue
+			ack, first, inputs = msg
+			self.remote_ack = max(self.remote_ack, ack)
+
+			for j in range(len(inputs)):
+				i = first + j
+				if i <= self.remote_confirmed or i in self.remote_inputs:
+					continue
+				self.remote_inputs[i] = inputs[j]
+
+				used = self.used_remote.get(i)
+				if used is not None and used != inputs[j] and (rollback_to is None or i < rollback_to):
+					rollback_to = i
+
+			# Messages can be reordered, so advance over however many consecutive frames are now known.
+			while self.remote_confirmed + 1 in self.remote_inputs:
+				self.remote_confirmed += 1
+		return rollback_to
+
+	# Restores the fight to before frame i and re-simulates it up to the present.
+	def rollback(self, i):
+		end = self.f.frame
+		self.f.restore(self.snapshots[i])
+		while self.f.frame < end:
+			self.step()
+		self.rollback_frames += end - i
+
+	# Sends every local input the remote peer hasn't acked.
+	def send(self):
+		first = self.remote_ack + 1
+		last = max(self.local_inputs)
+		inputs = [self.local_inputs[i] for i in range(first, last + 1)]
+		self.transport.send(encode_inputs(self.remote_confirmed, first, inputs))
+
+	# Drops inputs and snapshots which can no longer be needed.
+	# Frames from remote_confirmed on may still be rolled back to, and the remote peer may be ahead, so frames not yet simulated are kept too.
+	def prune(self):
+		keep = min(self.remote_confirmed, self.f.frame)
+		for d in (self.snapshots, self.used_remote, self.remote_inputs):
+			for i in [i for i in d if i < keep]:
+				del d[i]
+		for i in [i for i in self.local_inputs if i < keep and i <= self.remote_ack]:
+			del self.local_inputs[i]
+
+	# Call once per tick with the local player's current controls.
+	# Returns True if the fight advanced a frame, or False if it had to wait for the remote player's inputs.
+	def advance(self, controls):
+		prof = profiler.current
+		if prof is not None:
+			t = profiler.clock()
+
+		rollback_to = self.receive()
+		if prof is not None:
+			t = prof.lap("net.receive", t)
+
+		if rollback_to is not None:
+			self.rollback(rollback_to)
+			if prof is not None:
+				t = prof.lap("rollback.resimulate", t)
+
+		if self.f.frame - self.remote_confirmed > self.max_rollback:
+			self.stalls += 1
+			self.send()
+			if prof is not None:
+				prof.lap("net.send", t)
+			return False
+
+		self.local_inputs[self.f.frame + self.input_delay] = tuple(int(bool(c)) for c in controls)
+		self.send()
+		if prof is not None:
+			t = prof.lap("net.send", t)
+
+		self.step()
+		self.prune()
+		if prof is not None:
+			prof.lap("rollback.step", t)
+		return True
+
+	# Returns (frame, snapshot) for the latest frame whose state depends only on confirmed inputs, or None if it isn't stored.
+	# Both peers reach the same snapshot for the same frame, so comparing these detects desyncs.
+	def confirmed_state(self):
+		i = min(self.remote_confirmed + 1, self.f.frame)
+		if i == self.f.frame:
+			return i, self.f.snapshot()
+		snap = self.snapshots.get(i)
+		if snap is None:
+			return None
+		return i, snap
@@ -0,0 +1,216 @@
+import sys
+import time
+import array
+import asyncio
+import random
+from moveset import *
+from net import *
+from rollback import pack_controls, unpack_controls
+
+# Dedicated server which hosts many two-player matches in one process.
+# Clients connect over TCP and are paired into matches in the order they arrive. Every match is stepped on one shared tick,
+# with the server's copy of each fight being the authoritative one.
+#
+# Messages from a client are a single byte of packed controls (see rollback.pack_controls()), and only the newest one each tick is used.
+# Messages of any other length are dropped.
+# Messages to a client are either a single byte holding the index of the fighter it plays, sent when its match starts,
+# or the fight.snapshot() of its match after each tick, as raw doubles, which the client restores and renders.
+
+# One match on the server.
+# Snapshots aren't sent to a client while more than max_buffer bytes are still waiting to be written to it, so clients that stop reading
+# can't make the server buffer without limit. Every snapshot holds the whole fight, so the client just skips the ones it missed.
+class match:
+	max_buffer = 64*1024
+
+	def __init__(self, players):
+		self.f = standard_fight(deterministic=True)
+
+		# Transport of the client playing each fighter.
+		self.players = players
+
+		for i in range(len(players)):
+			players[i].send(bytes([i]))
+
+	# Whether either player has disconnected.
+	def is_over(self):
+		for p in self.players:
+			if p.closed:
+				return True
+		return False
+
+	# Applies the newest controls from each player, steps the fight, and sends both players the result.
+	def tick(self):
+		for i in range(len(self.players)):
+			msgs = [m for m in self.players[i].receive() if len(m) == 1]
+			if len(msgs) > 0:
+				self.f.fighters[i].set_controls(unpack_controls(msgs[-1][0]))
+
+		self.f.update()
+
+		snap = self.f.snapshot().tobytes()
+		for p in self.players:
+			if p.buffered() <= self.max_buffer:
+				p.send(snap)
+
+	def close(self):
+		for p in self.players:
+			p.close()
+
+class game_server:
+	# tick_rate is the number of times per second every match is stepped.
+	# The CPU time of the last history ticks is kept for stats().
+	def __init__(self, tick_rate=30, history=300):
+		self.tick_rate = tick_rate
+		self.matches = []
+
+		# Clients that have connected but aren't in a match yet.
+		self.lobby = []
+
+		self.server = None
+		self.ticks = 0
+
+		# CPU time in seconds spent on each recent tick.
+		self.tick_times = []
+		self.history = history
+
+	# Starts accepting clients. Returns once the server is listening. Call run() to start stepping matches.
+	async def listen(self, ip, port):
+		loop = asyncio.get_running_loop()
+		self.server = await loop.create_server(self.new_client, ip, port)
+
+	def new_client(self):
+		t = stream_transport()
+		self.lobby.append(t)
+		return t
+
+	# Pairs up waiting clients and drops matches that are over.
+	# Clients are added to the lobby as soon as their transport is created, so ones that haven't finished connecting are skipped.
+	def matchmake(self):
+		self.lobby = [t for t in self.lobby if not t.closed]
+		ready = [t for t in self.lobby if t.transport is not None]
+		while len(ready) >= 2:
+			self.matches.append(match(ready[:2]))
+			ready = ready[2:]
+		self.lobby = [t for t in self.lobby if t.transport is None] + ready
+
+		running = []
+		for m in self.matches:
+			if m.is_over():
+				m.close()
+			else:
+				running.append(m)
+		self.matches = running
+
+	# Steps every match once and records the CPU time taken.
+	def tick(self):
+		t = time.thread_time()
+
+		self.matchmake()
+		for m in self.matches:
+			m.tick()
+
+		self.tick_times.append(time.thread_time() - t)
+		if len(self.tick_times) > self.history:
+			del self.tick_times[0]
+		self.ticks += 1
+
+	# Steps every match on a fixed tick for n ticks, or forever if n is None.
+	# Ticks are scheduled against the start time, so a slow tick doesn't push back every tick after it. If the server falls behind, it skips ahead.
+	async def run(self, n=None):
+		loop = asyncio.get_running_loop()
+		next_tick = loop.time()
+		i = 0
+		while n is None or i < n:
+			self.tick()
+			i += 1
+
+			next_tick += 1 / self.tick_rate
+			if next_tick < loop.time():
+				next_tick = loop.time()
+			await asyncio.sleep(next_tick - loop.time())
+
+	# Returns (matches, median, 99th percentile, max) of the CPU time in seconds of recent ticks.
+	def stats(self):
+		if len(self.tick_times) == 0:
+			return len(self.matches), 0, 0, 0
+		times = sorted(self.tick_times)
+		return len(self.matches), times[len(times) // 2], times[min(len(times) - 1, len(times) * 99 // 100)], times[-1]
+
+	def close(self):
+		self.server.close()
+		for m in self.matches:
+			m.close()
+		for t in self.lobby:
+			t.close()
+
+# -------- Load Generator --------
+
+# Simulated client which presses random controls every tick and counts the snapshots it gets back.
+class load_client:
+	def __init__(self, transport, seed):
+		self.transport = transport
+		self.rnd = random.Random(seed)
+		self.controls = [0]*5
+
+		self.player = None
+		self.snapshots = 0
+		self.last = None
+
+	def tick(self):
+		for c in range(5):
+			if self.rnd.random() < 0.1:
+				self.controls[c] = 1 - self.controls[c]
+		self.transport.send(bytes([pack_controls(self.controls)]))
+
+		for msg in self.transport.receive():
+			if len(msg) == 1:
+				self.player = msg[0]
+			else:
+				self.snapshots += 1
+				self.last = msg
+
+	# Returns the last snapshot received as an array for fight.restore(), or None.
+	def snapshot(self):
+		if self.last is None:
+			return None
+		return array.array("d", self.last)
+
+# Connects n simulated clients to the server at ip:port and returns them.
+async def connect_clients(ip, port, n):
+	clients = []
+	for i in range(n):
+		clients.append(load_client(await connect(ip, port, udp=False), i))
+	return clients
+
+# Plays n ticks with every client at tick_rate.
+async def play(clients, n, tick_rate=30):
+	loop = asyncio.get_running_loop()
+	next_tick = loop.time()
+	for i in range(n):
+		for c in clients:
+			c.tick()
+
+		next_tick += 1 / tick_rate
+		await asyncio.sleep(max(0, next_tick - loop.time()))
+
+# Run "py server.py [port]" to host matches until interrupted. Tick CPU times are printed every few seconds.
+if __name__ == "__main__":
+	port = 42069
+	if len(sys.argv) > 1:
+		port = int(sys.argv[1])
+
+	async def main():
+		s = game_server()
+		await s.listen("0.0.0.0", port)
+		print("Hosting matches on port %d..." % port)
+
+		async def report():
+			while True:
+				await asyncio.sleep(5)
+				n, p50, p99, worst = s.stats()
+				print("%d matches, %d waiting. Tick CPU time: %.2f ms p50, %.2f ms p99, %.2f ms max" % (n, len(s.lobby), p50*1e3, p99*1e3, worst*1e3))
+
+		asyncio.ensure_future(report())
+		await s.run()
+
+	asyncio.run(main())
@@ -1,7 +1,13 @@
 import sys
+import asyncio
 import pygame as pg
 import socket as sk
 from fighter import *
+from moveset import *
+from net import *
+from rollback import *
+from clock import *
+import profiler
 
 # Start or connect to server.
 def p_help():
@@ -58,97 +64,68 @@ elif len(sys.argv) == 3:
 	print("Connecting to server at %s:%d..." % (sys.argv[1], port))
 	iam = "client"
 
-# Create or Connect to server
-if iam == "server":
-	s = sk.socket(sk.AF_INET, sk.SOCK_STREAM)
-	s.bind((ip, port))
-	s.listen()
-	conn, addr = s.accept()
-elif iam == "client":
-	s = sk.socket(sk.AF_INET, sk.SOCK_STREAM)
-	s.connect((ip, port))
-	conn = s
-else:
+if iam not in ("server", "client"):
 	print("What?")
 	print("No.")
 	exit()
 
-#conn.setblocking(0)
+async def main():
+	# Create or Connect to server
+	if iam == "server":
+		conn = await serve(ip, port)
+	else:
+		conn = await connect(ip, port)
+
+	print("Connection Formed over %s." % ("UDP" if type(conn) == udp_transport else "TCP"))
+
+	pg.init()
+
+	width = 1600
+	height = 900
+
+	s = pg.display.set_mode((width, height))
+
+	# Both peers build the same deterministic fight, so that rollbacks re-simulate identically on both.
+	# The server plays fighter 0 and the client plays fighter 1.
+	f = standard_fight(deterministic=True)
+	local = 0 if iam == "server" else 1
+	session = rollback_session(f, local, conn)
+
+	cam = camera((-width//2, -height//2, width, height), s)
+	health_bars = pg.Rect(0, 0, width, 15)
+
+	# The fight is simulated at 30 frames per second, and drawn at display_rate frames per second, interpolating between simulated frames.
+	# A slow frame delays drawing but not the simulation, which catches up on the next one.
+	display_rate = 60
+	sim = fixed_step(30)
+
+	# F3 turns the profiler and its overlay on and off, and F4 writes what it has recorded to profile.json and profile.csv.
+	# overlay is the screen rect the overlay was last drawn over, which must be redrawn when it changes or goes away.
+	overlay = None
+
+	# The network is serviced while waiting for the next frame, so nothing here ever blocks on it.
+	loop = asyncio.get_running_loop()
+	next_frame = loop.time()
+	while True:
+		next_frame = max(next_frame + 1/display_rate, loop.time())
+		await asyncio.sleep(next_frame - loop.time())
+		frame_start = profiler.clock()
+
+		for event in pg.event.get():
+			if event.type == pg.QUIT:
+				conn.close()
+				sys.exit()
+
+			if event.type == pg.KEYDOWN and event.key == pg.K_F3:
+				if profiler.current is None:
+					profiler.enable()
+				else:
+					profiler.disable()
+			if event.type == pg.KEYDOWN and event.key == pg.K_F4 and profiler.current is not None:
+				profiler.current.dump_json("profile.json")
+				profiler.current.dump_csv("profile.csv")
+				print("Wrote profile.json and profile.csv.")
 
-print("Connection Formed.")
-
-pg.init()
-
-width = 1600
-height = 900
-
-s = pg.display.set_mode((width, height))
-
-# Define Hitboxes, Stances, Attacks, & Connections
-standing_hb = Hitbox(Rectangle(-12, -75, 12, 0))
-
-Standing = stance(standing_hb)
-Jab1 = stance(standing_hb, Standing, 6)
-Jab2 = stance(standing_hb, Standing, 6)
-
-atk_anim1 = collider_anim()
-atk_anim1.add_col(Rectangle(12, -55, 22, -45), 4, 0)
-atk_anim1.add_col(Rectangle(12, -55, 42, -45), 4, 2)
-atk_anim1.add_col(Rectangle(12, -55, 42, -45), 4, 4)
-
-atk_anim2 = collider_anim()
-atk_anim2.add_col(Rectangle(12, -45, 22, -35), 4, 0)
-atk_anim2.add_col(Rectangle(12, -45, 42, -35), 4, 2)
-atk_anim2.add_col(Rectangle(12, -45, 42, -35), 4, 4)
-
-atk_anim3 = collider_anim()
-atk_anim3.add_col(Rectangle(12, -50, 12, -40), 8, 4)
-atk_anim3.add_col(Rectangle(12, -50, 47, -40), 8, 7)
-atk_anim3.add_col(Rectangle(12, -50, 47, -40), 8, 10)
-
-atk1 = attack(4)
-atk1.add_anim(atk_anim1)
-
-atk2 = attack(4)
-atk2.add_anim(atk_anim2)
-
-atk3 = attack(10)
-atk3.add_anim(atk_anim3)
-
-Standing.add_connection(Jab1, fighter.BASIC, transition_time=4, time_in=3, time_out=None, atk=atk1)
-Jab1.add_connection(Jab2, fighter.BASIC, transition_time=4, time_in=3, time_out=None, atk=atk2)
-Jab2.add_connection(Standing, fighter.BASIC, transition_time=10, time_in=3, time_out=None, atk=atk3)
-
-f = fight()
-f.add_platform(pg.Rect(-500, 300, 1000, 20))
-f.add_platform(pg.Rect(-400, 150, 200, 20))
-f.add_platform(pg.Rect(200, 150, 200, 20))
-
-f.add_fighter(pg.Rect(-12, -75, 24, 75), Standing, team=0)
-f.add_fighter(pg.Rect(-12, -75, 24, 75), Standing, team=1)
-if iam == "server":
-	f.fighters[0].pos.x = -300
-	f.fighters[1].pos.x = 300
-else:
-	f.fighters[0].pos.x = 300
-	f.fighters[1].pos.x = -300
-
-cam = camera((-width//2, -height//2, width, height), s)
-
-clk = pg.time.Clock()
-
-fn = 0
-while True:
-	fn += 1
-
-	clk.tick(30)
-
-	for event in pg.event.get():
-		if event.type == pg.QUIT:
-			conn.close()
-			sys.exit()
-
-	if fn % 2 == 0:
 		k = pg.key.get_pressed()
 
 		k_e = [False]*5
@@ -158,24 +135,33 @@ while True:
 		k_e[fighter.RIGHT] = k[pg.K_RIGHT]
 		k_e[fighter.BASIC] = k[pg.K_a]
 
-		conn.send(bytes(k_e))
+		for i in range(sim.advance()):
+			session.advance(k_e)
+			cam.set_target_from_fight(f)
+			cam.tick()
+
+		# Only the parts of the screen that changed are redrawn and sent to the display, which is most of the time saved while the camera is still.
+		extra = [health_bars]
+		if overlay is not None:
+			extra.append(overlay)
+		dirty = cam.render_dirty(f, debug=True, extra=extra, blend=sim.blend())
 
-#		try:
-		l_e = list(conn.recv(5))
-#		except BlockingIOError:
-#			l_e = None
-		print(l_e)
+		# The local player's health is on the left.
+		me = f.fighters[local]
+		them = f.fighters[1 - local]
+		pg.draw.rect(s, (200, 20, 20), (0, 0, (me.health/100)*(width/2), 15))
+		pg.draw.rect(s, (200, 20, 20), (width - (them.health/100)*(width/2), 0, width/2, 15))
 
-		for i in range(len(k_e)):
-			f.fighters[0].set_control(i, k_e[i])
-			f.fighters[1].set_control(i, l_e[i])
+		prof = profiler.current
+		overlay = None
+		if prof is not None:
+			overlay = prof.draw(s, 0, 20)
+			dirty.append(overlay)
 
-	f.update()
+		pg.display.update(dirty)
 
-	s.fill((0, 0, 0))
-	cam.set_target_from_fight(f)
-	cam.render(f, debug=True)
-	pg.draw.rect(s, (200, 20, 20), (0, 0, (f.fighters[0].health/100)*(width/2), 15))
-	pg.draw.rect(s, (200, 20, 20), (width - (f.fighters[1].health/100)*(width/2), 0, width/2, 15))
-	pg.display.flip()
+		if prof is not None:
+			prof.lap("frame", frame_start)
+			prof.end_frame()
 
+asyncio.run(main())
@@ -0,0 +1,17 @@
+import pytest
+import batch
+from moveset import *
+
+# Matches played across a pool of processes must come out exactly as when played one after another here.
+@pytest.mark.parametrize("deterministic", [False, True])
+def test_batch_matches_serial(deterministic):
+	scripts = [brawl_inputs(300, seed) for seed in range(8)]
+
+	batch.init_worker(jab_combo)
+	expected = [batch.run_job((batch.pack_script(s), deterministic)) for s in scripts]
+	results = batch.run_batch(jab_combo, scripts, deterministic, processes=2, chunksize=3)
+
+	assert len(results) == len(expected)
+	for r, e in zip(results, expected):
+		assert (r.winner, r.hits, r.damage, r.health) == (e.winner, e.hits, e.damage, e.health)
+	assert sum(sum(e.hits) for e in expected) > 0
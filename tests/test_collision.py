@@ -0,0 +1,100 @@
+import random
+import pytest
+from collision import *
+from moveset import transformed_copy, crowd, attack_hits_all_pairs
+
+# Random collider within a 20x20 area around the origin. Coordinates are sometimes integers, so that touching cases come up.
+def random_collider(rnd):
+	def coord():
+		return rnd.choice([rnd.randint(-10, 10), rnd.uniform(-10, 10)])
+
+	t = rnd.randrange(3)
+	if t == 0:
+		return Rectangle(coord(), coord(), coord(), coord())
+	elif t == 1:
+		return Circle(coord(), coord(), abs(coord()) + 0.5)
+	return Point(rnd.randint(-3, 3), rnd.randint(-3, 3))
+
+def random_hitbox(rnd):
+	return Hitbox([random_collider(rnd) for j in range(rnd.randint(0, 4))])
+
+# The transform-aware path must give the same results as colliding transformed copies.
+def test_collide_hitbox_at_matches_transformed_copies():
+	rnd = random.Random(0)
+	for i in range(20000):
+		a = random_hitbox(rnd)
+		b = random_hitbox(rnd)
+		fa, fb = rnd.choice([-1, 1]), rnd.choice([-1, 1])
+		pa, pb = vec2(rnd.randint(-5, 5), rnd.uniform(-5, 5)), vec2(rnd.uniform(-5, 5), rnd.randint(-5, 5))
+
+		ca, cb = transformed_copy(a, fa, pa), transformed_copy(b, fb, pb)
+		expected = ca.collide_hitbox(cb)
+		got = a.collide_hitbox_at(fa, pa, b, fb, pb)
+
+		assert (expected is None) == (got is None), "collide_hitbox_at(%s, %s)" % (a, b)
+		if got is not None:
+			# Collisions from the transformed copies reference the copies, so compare which colliders hit by index.
+			assert ca.colliders.index(expected.a) == a.colliders.index(got.a)
+			assert cb.colliders.index(expected.b) == b.colliders.index(got.b)
+			assert expected.r == got.r
+
+def test_collide_collider_at_matches_transformed_copies():
+	rnd = random.Random(1)
+	for i in range(20000):
+		a = random_hitbox(rnd)
+		c = random_collider(rnd)
+		fa, fc = rnd.choice([-1, 1]), rnd.choice([-1, 1])
+		pa, pc = vec2(rnd.randint(-5, 5), rnd.uniform(-5, 5)), vec2(rnd.uniform(-5, 5), rnd.randint(-5, 5))
+
+		expected = transformed_copy(a, fa, pa).collide_hitbox(transformed_copy(Hitbox(c), fc, pc))
+		got = a.collide_collider_at(fa, pa, c, fc, pc)
+
+		assert (expected is None) == (got is None), "collide_collider_at(%s, %s)" % (a, c)
+		if got is not None:
+			assert expected.r == got.r
+
+# The NumPy batch engine must find the same first collision as the Python path, and every contact with all_contacts.
+def test_collide_hitbox_batch_matches_collide_hitbox():
+	pytest.importorskip("numpy")
+	from collision_np import collide_hitbox_batch
+
+	rnd = random.Random(2)
+	for i in range(20000):
+		a = random_hitbox(rnd)
+		b = random_hitbox(rnd)
+
+		expected = a.collide_hitbox(b)
+		got = collide_hitbox_batch(a, b)
+
+		assert (expected is None) == (got is None), "collide_hitbox_batch(%s, %s)" % (a, b)
+		if got is not None:
+			assert got.a is expected.a and got.b is expected.b
+			assert abs(got.r.x - expected.r.x) <= 1e-9 and abs(got.r.y - expected.r.y) <= 1e-9
+
+		contacts = collide_hitbox_batch(a, b, all_contacts=True)
+		assert len(contacts) == sum(1 for cb in b.colliders for ca in a.colliders if Hitbox(ca).collide_hitbox(Hitbox(cb)) is not None)
+
+# Sweep and prune must find exactly the hits, in the same order, as testing every attacker against every defender.
+# Fighters face both ways, some stand on top of each other, some are idle, and some targets are immune to some attackers.
+@pytest.mark.parametrize("n, spacing", [(2, 15), (16, 50), (16, 5), (64, 20), (256, 50)])
+def test_attack_hits_match_all_pairs(n, spacing):
+	hits = []
+	immune = 0
+	for seed in range(max(5, 200 // n)):
+		f = crowd(n, seed, spacing)
+		rnd = random.Random(seed)
+		for a in f.fighters:
+			if rnd.random() < 0.1:
+				a.atk = None
+		for a, b, dmg in attack_hits_all_pairs(f):
+			if rnd.random() < 0.3:
+				b.add_immunity(a)
+				immune += 1
+
+		expected = attack_hits_all_pairs(f)
+		assert f.attack_hits() == expected
+		hits += expected
+
+	# Otherwise the cases above would prove little.
+	assert any(a.facing == -1 for a, b, dmg in hits) and any(a.facing == 1 for a, b, dmg in hits)
+	assert immune > 0
@@ -0,0 +1,28 @@
+import multiprocessing
+from moveset import *
+
+# Returns the checksum of every frame of a deterministic standard_fight() played with the passed inputs.
+def match_checksums(inputs):
+	f = standard_fight(deterministic=True)
+	sums = []
+	for frame_inputs in inputs:
+		f.simulate(1, [frame_inputs])
+		sums.append(f.checksum())
+	return sums
+
+def test_checksums_match_across_runs():
+	inputs = brawl_inputs(3000)
+	assert match_checksums(inputs) == match_checksums(inputs)
+
+# A fresh interpreter has different hash seeds and object addresses, which must not leak into the simulation.
+def test_checksums_match_across_processes():
+	inputs = brawl_inputs(3000)
+	with multiprocessing.get_context("spawn").Pool(1) as pool:
+		other_process = pool.apply(match_checksums, (inputs,))
+	assert match_checksums(inputs) == other_process
+
+# The fight must actually play out, or matching checksums would prove nothing.
+def test_brawl_lands_hits():
+	f = standard_fight(deterministic=True)
+	f.simulate(3000, brawl_inputs(3000))
+	assert f.fighters[0].health < 100 and f.fighters[1].health < 100
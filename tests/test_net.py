@@ -0,0 +1,55 @@
+import asyncio
+from net import *
+
+# If the client connected over TCP first, a stray UDP hello must neither take over the server's transport nor be answered.
+def test_udp_hello_after_tcp_connect_is_ignored():
+	async def hello_after_tcp():
+		connected = asyncio.get_running_loop().create_future()
+		connected.set_result("tcp")
+		udp = udp_transport(3, connected)
+		udp.datagram_received(b"h", ("127.0.0.1", 9999))
+		return udp
+
+	udp = asyncio.run(hello_after_tcp())
+	assert udp.peer is None and not udp.answered and udp.receive() == []
+
+# Stands in for an asyncio datagram transport, keeping what is sent.
+class sent_datagrams:
+	def __init__(self):
+		self.sent = []
+
+	def sendto(self, data, addr=None):
+		self.sent.append((data, addr))
+
+def test_udp_drops_malformed_datagrams():
+	sender = udp_transport()
+	sender.connection_made(sent_datagrams())
+	sender.send(b"abc")
+	sender.send(b"defgh")
+	whole = sender.transport.sent[-1][0]
+
+	udp = udp_transport()
+	udp.connection_made(sent_datagrams())
+	for data in [b"\x00" * 6 + b"\x01", whole[:-1], whole[:4], whole + b"\x00"]:
+		udp.datagram_received(data, None)
+	assert udp.receive() == [] and not udp.answered
+
+	udp.datagram_received(whole, None)
+	assert udp.receive() == [b"abc", b"defgh"]
+
+# Only a hello may make its sender the server's peer.
+def test_udp_server_only_adopts_a_hello():
+	async def stray_then_hello():
+		connected = asyncio.get_running_loop().create_future()
+		udp = udp_transport(3, connected)
+		udp.connection_made(sent_datagrams())
+		udp.datagram_received(b"\x00" * 6 + b"\x01", ("127.0.0.1", 1111))
+		udp.datagram_received(b"junk", ("127.0.0.1", 1111))
+		assert udp.peer is None and not connected.done()
+
+		udp.datagram_received(b"h", ("127.0.0.1", 2222))
+		assert connected.done() and connected.result() is udp
+		return udp
+
+	udp = asyncio.run(stray_then_hello())
+	assert udp.peer == ("127.0.0.1", 2222) and udp.transport.sent == [(b"h", ("127.0.0.1", 2222))]
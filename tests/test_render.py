@@ -0,0 +1,88 @@
+import os
+import math
+import pytest
+from moveset import *
+
+@pytest.fixture
+def screen():
+	os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+	pg.init()
+	yield pg.display.set_mode((1600, 900))
+	pg.quit()
+
+# Every frame drawn by render_dirty() must be exactly what a full redraw of the same frame gives.
+def test_render_dirty_matches_full_redraw(screen):
+	f = art_stage()
+	cam = camera((-800, -450, 1600, 900), screen)
+	ref = camera(cam.c, pg.Surface(screen.get_size()))
+
+	hud = pg.Rect(0, 0, 1600, 15)
+	for i in range(200):
+		for j in range(len(f.fighters)):
+			f.fighters[j].pos.x = -200 + 400*j + 100 * math.sin(i / 20 + j)
+
+		dirty = cam.render_dirty(f, debug=True, extra=[hud])
+		if i > 0:
+			# The camera is still, so only the fighters and the HUD should be redrawn.
+			assert dirty != [screen.get_rect()]
+
+		ref.c = pg.Rect(cam.c)
+		ref.s.fill((0, 0, 0))
+		ref.draw(f, debug=True)
+		assert pg.image.tobytes(screen, "RGB") == pg.image.tobytes(ref.s, "RGB"), "frame %d" % i
+
+# At any zoom, a platform's image must cover exactly the area of the platform.
+def test_platform_images_match_platform_size(screen):
+	f = fight()
+	img = pg.Surface((1200, 100))
+	img.fill((255, 0, 0))
+	f.add_platform(pg.Rect(0, 0, 1200, 100), img)
+
+	cam = camera((-100, -100, 1400, 788), screen)
+	cam.render(f)
+	drawn = pg.mask.from_threshold(screen, (255, 0, 0), (1, 1, 1, 255)).get_bounding_rects()
+	assert drawn == [pg.Rect(int(100 * 1600 / 1400), int(100 * 900 / 788), int(1200 * 1600 / 1400), int(100 * 900 / 788))]
+
+# Nearby sizes share one cached copy, which is cut down to each size exactly.
+def test_scale_cache_reuses_copies_for_nearby_sizes():
+	cache = scale_cache()
+	img = pg.Surface((1200, 700))
+	assert cache.get(img, 1190, 694).get_size() == (1190, 694)
+	assert cache.get(img, 1200, 700).get_size() == (1200, 700)
+	assert len(cache.surfaces) == 1
+
+# Between ticks, the camera must glide by fractions of a world unit instead of stepping by whole ones.
+def test_blended_view_is_not_rounded(screen):
+	f = art_stage()
+	cam = camera((-400, -225, 800, 450), screen)
+	cam.tick()
+	cam.c = pg.Rect(-399, -225, 800, 450)
+
+	frames = []
+	for blend in [0, 0.5, 1]:
+		cam.render(f, blend=blend)
+		frames.append(pg.image.tobytes(screen, "RGB"))
+		cam.render_dirty(f, blend=blend)
+		assert pg.image.tobytes(screen, "RGB") == frames[-1]
+	assert frames[0] != frames[1] != frames[2]
+
+# Fonts and labels cached before pg.quit() must not be used after the next pg.init(), which crashes.
+def test_labels_after_reinit():
+	os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+	for i in range(3):
+		pg.init()
+		surf = pg.Surface((200, 50))
+		debug_rect(surf, (255, 0, 0), pg.Rect(0, 0, 200, 50), "Platform %d" % i)
+		# The label is drawn inside the outline.
+		assert pg.transform.average_color(surf, (2, 2, 196, 46)) != (0, 0, 0, 255)
+		pg.quit()
+
+def test_profiler_overlay_after_reinit():
+	os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+	for i in range(3):
+		pg.init()
+		prof = profiler.frame_profiler()
+		prof.lap("phase %d" % i, profiler.clock())
+		prof.end_frame()
+		prof.draw(pg.Surface((400, 100)), 0, 0)
+		pg.quit()
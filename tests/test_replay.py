@@ -0,0 +1,52 @@
+import gc
+import pytest
+import warnings
+from moveset import *
+from replay import *
+
+def walk_inputs(i):
+	return [[False, i % 40 < 20, i % 40 >= 20, False, i % 9 == 0], [i % 13 == 0, False, True, False, i % 7 == 0]]
+
+# A writer that is never closed, as when the game crashes, must leave all but the last few frames readable.
+def test_unclosed_replay_keeps_recorded_frames(tmp_path):
+	path = tmp_path / "match.rpl"
+	f = standard_fight()
+	w = replay_writer(path, f, block_frames=30)
+	for i in range(100):
+		for fi, vals in zip(f.fighters, walk_inputs(i)):
+			fi.set_controls(vals)
+		w.record()
+		f.update()
+
+	r = replay(path)
+	assert r.frames == 90
+	g = standard_fight()
+	r.seek(g, 90)
+	h = standard_fight()
+	h.simulate(90, lambda h: walk_inputs(h.frame))
+	assert g.snapshot() == h.snapshot()
+	r.close()
+	w.close()
+
+good_header = header.pack(magic, version, 2, 300)
+
+@pytest.mark.parametrize("data", [
+	b"FRPL",
+	b"NOPE" + bytes(8),
+	b"FRPL" + bytes([99, 0]) + bytes(6),
+	# Trailers pointing past the end of the file, at the header, and at an index longer than the file.
+	good_header + trailer.pack(1 << 40, trailer_magic),
+	good_header + trailer.pack(0, trailer_magic),
+	good_header + record.pack(b"X", 10, 1000) + trailer.pack(header.size, trailer_magic),
+	# An index pointing at a keyframe past the index.
+	good_header + record.pack(b"X", 10, 1) + index_entry.pack(0, 1 << 40) + trailer.pack(header.size, trailer_magic),
+])
+def test_bad_replay_closes_file(tmp_path, data):
+	path = tmp_path / "bad.rpl"
+	path.write_bytes(data)
+	with warnings.catch_warnings(record=True) as caught:
+		warnings.simplefilter("always")
+		with pytest.raises(ValueError):
+			replay(path)
+		gc.collect()
+	assert not [w for w in caught if issubclass(w.category, ResourceWarning)]
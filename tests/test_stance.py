@@ -0,0 +1,66 @@
+import random
+import pytest
+from moveset import *
+
+# Stance with a connection for each (trigger, time_in, time_out), added in order. Each connects to a stance of its own, so they can be told apart.
+def stance_with(windows):
+	hb = Hitbox(Rectangle(-12, -75, 12, 0))
+	s = stance(hb)
+	for trigger, ti, to in windows:
+		s.add_connection(stance(hb), trigger, time_in=ti, time_out=to)
+	return s
+
+# Checks event() against the linear scan at every bound, just inside and outside of it, and in between.
+def check_event(s, times):
+	for trigger in set(c.trigger for c in s.connections) | {99}:
+		for t in times:
+			assert s.event(trigger, t) is s.first_valid(trigger, t), "trigger %d, t %r" % (trigger, t)
+
+def window_times(s):
+	times = {-1000, 1000}
+	for c in s.connections:
+		for b in [c.ti, c.to]:
+			if b is not None:
+				times |= {b - 1, b - 0.5, b - 1e-9, b, b + 1e-9, b + 0.5, b + 1}
+	return sorted(times)
+
+@pytest.mark.parametrize("windows", [
+	# Gaps between windows, where nothing is valid.
+	[(0, 0, 5), (0, 10, 15), (0, 20, None)],
+	# Overlapping windows, where the first one added wins.
+	[(0, 0, 10), (0, 5, 15), (0, 2, None), (0, 5, 15)],
+	[(0, 5, 15), (0, 0, 10)],
+	# Windows that end where another starts, and windows of a single frame.
+	[(0, 0, 5), (0, 5, 10), (0, 3, 4), (0, 10, 11)],
+	# Several triggers with windows at the same times.
+	[(0, 0, 5), (1, 0, 5), (1, 2, None), (0, 5, 10), (2, 0, None)],
+	# Non-integer times.
+	[(0, 0.5, 2.25), (0, 1.75, 3.5), (1, -0.5, None)],
+])
+def test_event_matches_first_valid(windows):
+	s = stance_with(windows)
+	check_event(s, window_times(s))
+
+	# Adding a connection rebuilds the index.
+	s.add_connection(s, 0, time_in=-5, time_out=None)
+	check_event(s, window_times(s))
+
+# The first and last frames of a window are exclusive, as in connection.is_valid().
+def test_event_window_ends():
+	s = stance_with([(0, 2, 6)])
+	c = s.connections[0]
+	assert [s.event(0, t) for t in [2, 3, 5, 6]] == [None, c, c, None]
+
+def test_event_matches_first_valid_on_random_graphs():
+	for n_stances, n_connections in [(500, 5000), (1, 500)]:
+		for s in move_graph(n_stances, n_connections):
+			check_event(s, [t / 2 for t in range(-2, 90)])
+
+	rnd = random.Random(1)
+	for i in range(200):
+		windows = []
+		for j in range(rnd.randint(1, 12)):
+			ti = rnd.choice([rnd.randint(0, 20), rnd.uniform(0, 20)])
+			windows.append((rnd.randint(0, 2), ti, rnd.choice([None, ti + rnd.uniform(0.1, 10)])))
+		s = stance_with(windows)
+		check_event(s, window_times(s))